@@ -0,0 +1,249 @@
+import argparse
+from collections import ChainMap
+import datetime
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from indicators import target_prices
+
+CONFIG_DIR = './configs'
+TIMESTAMP, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+EXIT_REASONS = ('stop_loss', 'low_trail', 'first_trail', 'second_trail', 'end_of_data')
+
+def load_config(config_dir:str = CONFIG_DIR) -> ChainMap:
+    config: ChainMap = ChainMap()
+    for filename in ['exchange', 'strategy', 'trailing']:
+        with open(f"{config_dir}/{filename}_config.json", 'r') as F:
+            config = ChainMap(config, json.load(F))
+    return config
+
+def load_ohlcv(path:str) -> np.ndarray:
+    # CSV 欄位依序為 timestamp, open, high, low, close, volume（與 fetch_ohlcv 相同），可有或沒有標題列
+    if path.endswith('.npy'):
+        return np.load(path).astype(np.float64, copy=False)
+    df = pd.read_csv(path, header=None, comment='#')
+    if not np.issubdtype(df.dtypes.iloc[0], np.number):
+        df = df.iloc[1:].astype(np.float64)
+    return df.iloc[:, :6].to_numpy(dtype=np.float64)
+
+def download_ohlcv(exc, pair:str, since:int, until:int | None = None, limit:int = 1000) -> np.ndarray:
+    # 以同步 ccxt 客戶端分頁下載 1m K線
+    until = until or exc.milliseconds()
+    rows = []
+    while since < until:
+        batch = exc.fetch_ohlcv(pair, timeframe='1m', since=since, limit=limit)
+        if not batch:
+            break
+        rows.extend(bar for bar in batch if bar[0] < until)
+        since = batch[-1][0] + 60_000
+    return np.asarray(rows, dtype=np.float64)
+
+def rolling_mean(values:np.ndarray, period:int) -> np.ndarray:
+    # 最近 period 個值的平均，不足一個週期時仍除以 period
+    csum = np.cumsum(np.nan_to_num(values))
+    out = csum.copy()
+    out[period:] = csum[period:] - csum[:-period]
+    return out / period
+
+def windowed_ema(close:np.ndarray, period:int, window:int) -> np.ndarray:
+    # 每根K線的 EMA 只以最近 window 根（含當根）計算、並以視窗第一根為起點，與 IndicatorEngine 的 WindowedEma 相同
+    # 加權和 S_t = Σ b^j·close[t-j]（j < n）以一次捲積取得，EMA = alpha·S_t + b^n·close[t-n+1]，n 為視窗內實際根數
+    alpha = 2 / (period + 1)
+    decay = 1 - alpha
+    weighted = np.convolve(close, decay ** np.arange(window))[:len(close)]
+    n = np.minimum(np.arange(1, len(close) + 1), window)
+    oldest = close[np.arange(len(close)) - n + 1]
+    return alpha * weighted + decay ** n * oldest
+
+def compute_signals(ohlcv:np.ndarray, pair_config:dict, atr_period:int = 60, amplitude_period:int = 60, window:int = 241) -> dict[str, np.ndarray]:
+    # 對整段價格一次計算每根K線收盤時 _process_pair 的判斷結果
+    # window 為 _fetch_kline_data 的 limit：實盤只保留這麼多根 1m K線，EMA 每輪都在這個視窗內重新起算
+    high, low, close = ohlcv[:, HIGH], ohlcv[:, LOW], ohlcv[:, CLOSE]
+
+    prev_close = np.empty_like(close)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    tr[0] = 0.0
+    atr = rolling_mean(tr, atr_period)
+
+    amplitude = (high - low) / close * 100
+    average_amplitude = rolling_mean(amplitude, amplitude_period)
+
+    value_multiplier = float(pair_config.get('value_multiplier', 2))
+    long_target, short_target = target_prices(close, atr, average_amplitude, value_multiplier)
+
+    ema_value = int(pair_config.get('ema', 240))
+    if ema_value == 0:
+        bullish = bearish = np.ones(len(close), dtype=bool)
+    else:
+        ema = windowed_ema(close, ema_value, window)
+        bullish = close > ema
+        bearish = close < ema
+
+    warmup = max(atr_period, amplitude_period, min(ema_value, window - 1)) + 1
+    bullish = bullish.copy()
+    bearish = bearish.copy()
+    bullish[:warmup] = bearish[:warmup] = False
+
+    return {
+        'long_target': long_target,
+        'short_target': short_target,
+        'bullish': bullish,
+        'bearish': bearish,
+    }
+
+def find_fills(ohlcv:np.ndarray, signals:dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    # 第 t 根收盤時掛出的限價單在第 t+1 根內成交：多單看最低價、空單看最高價
+    long_fill = np.zeros(len(ohlcv), dtype=bool)
+    short_fill = np.zeros(len(ohlcv), dtype=bool)
+    long_fill[1:] = signals['bullish'][:-1] & (ohlcv[1:, LOW] <= signals['long_target'][:-1])
+    short_fill[1:] = signals['bearish'][:-1] & (ohlcv[1:, HIGH] >= signals['short_target'][:-1])
+    return long_fill, short_fill
+
+def simulate_exit(ohlcv:np.ndarray, entry:int, entry_price:float, side:int, trail:dict, window:int = 64) -> tuple[int, float, int]:
+    # 以向量運算模擬 trail_bybit 的檔位與止損規則，回傳 (出場K線, 出場盈虧%, 出場原因)
+    # 每根K線先以前一根為止的最高盈虧檢查逆向極值是否觸發，再以順向極值更新最高盈虧
+    stop_loss = trail['stop_loss_pct']
+    thresholds = (trail['low_trail_enable_threshold'], trail['first_trail_enable_threshold'], trail['second_trail_enable_threshold'])
+
+    n = len(ohlcv)
+    start = entry + 1
+    peak_before = 0.0
+    while start < n:
+        end = min(start + window, n)
+        bars = ohlcv[start:end]
+        favorable = bars[:, HIGH] if side > 0 else bars[:, LOW]
+        adverse = bars[:, LOW] if side > 0 else bars[:, HIGH]
+
+        peak = np.maximum.accumulate(np.maximum(side * (favorable - entry_price) / entry_price * 100, peak_before))
+        prev_peak = np.empty_like(peak)
+        prev_peak[0] = peak_before
+        prev_peak[1:] = peak[:-1]
+
+        tier = (prev_peak >= thresholds[0]).astype(np.int8) + (prev_peak >= thresholds[1]) + (prev_peak >= thresholds[2]) - 1
+        level = np.full(len(bars), -stop_loss)
+        level = np.where(tier == 0, trail['low_trail_stop_loss_pct'], level)
+        level = np.where(tier == 1, prev_peak * (1 - trail['trail_stop_loss_pct']), level)
+        level = np.where(tier == 2, prev_peak * (1 - trail['higher_trail_stop_loss_pct']), level)
+        level = np.maximum(level, -stop_loss)
+
+        triggered = side * (adverse - entry_price) / entry_price * 100 <= level
+        if triggered.any():
+            k = int(np.argmax(triggered))
+            open_profit = side * (bars[k, OPEN] - entry_price) / entry_price * 100
+            return start + k, float(min(level[k], open_profit)), int(tier[k]) + 1
+
+        peak_before = float(peak[-1])
+        start = end
+        window *= 2
+
+    last = n - 1
+    return last, float(side * (ohlcv[last, CLOSE] - entry_price) / entry_price * 100), len(EXIT_REASONS) - 1
+
+def run_backtest(ohlcv:np.ndarray, pair_config:dict, trail:dict, leverage:int = 10, maker_fee:float = 0.0002, taker_fee:float = 0.00055, initial_capital:float = 1000.0, signals:dict | None = None) -> dict:
+    # 單一倉位模型：持倉期間不再進場，避免與單向持倉模式下的反向成交互相抵銷
+    # `signals` 可傳入已計算好的 compute_signals() 結果，參數掃描時同一組 ema/value_multiplier 可重複使用
+    if signals is None:
+        signals = compute_signals(ohlcv, pair_config)
+    long_fill, short_fill = find_fills(ohlcv, signals)
+    fill_bars = np.flatnonzero(long_fill | short_fill)
+
+    long_notional = float(pair_config.get('long_amount_usdt', 20)) * leverage
+    short_notional = float(pair_config.get('short_amount_usdt', 20)) * leverage
+
+    trades = []
+    free_from = 0
+    while True:
+        i = np.searchsorted(fill_bars, free_from)
+        if i >= len(fill_bars):
+            break
+        t = int(fill_bars[i])
+
+        if long_fill[t] and short_fill[t]:
+            # 同一根K線內多空皆觸價時，取較接近開盤價的一側先成交
+            side = 1 if ohlcv[t, OPEN] - signals['long_target'][t-1] <= signals['short_target'][t-1] - ohlcv[t, OPEN] else -1
+        else:
+            side = 1 if long_fill[t] else -1
+        entry_price = min(signals['long_target'][t-1], ohlcv[t, OPEN]) if side > 0 else max(signals['short_target'][t-1], ohlcv[t, OPEN])
+
+        exit_bar, profit_pct, reason = simulate_exit(ohlcv, t, entry_price, side, trail)
+        notional = long_notional if side > 0 else short_notional
+        fee = notional * maker_fee + notional * (1 + profit_pct / 100) * taker_fee
+        trades.append((t, exit_bar, side, entry_price, profit_pct, notional * profit_pct / 100 - fee, reason))
+        free_from = exit_bar + 1
+
+    trades = np.array(trades, dtype=[
+        ('entry_bar', np.int64), ('exit_bar', np.int64), ('side', np.int8), ('entry_price', np.float64),
+        ('profit_pct', np.float64), ('pnl', np.float64), ('reason', np.int8),
+    ])
+    return summarize(ohlcv, signals, trades, initial_capital)
+
+def summarize(ohlcv:np.ndarray, signals:dict[str, np.ndarray], trades:np.ndarray, initial_capital:float) -> dict:
+    equity = initial_capital + np.cumsum(trades['pnl']) if len(trades) else np.array([initial_capital])
+    running_max = np.maximum.accumulate(np.concatenate(([initial_capital], equity)))
+    drawdown = (running_max[1:] - equity) / running_max[1:] * 100 if len(trades) else np.zeros(1)
+
+    orders_placed = int(signals['bullish'][:-1].sum() + signals['bearish'][:-1].sum())
+    pnl = float(trades['pnl'].sum())
+    return {
+        'bars': len(ohlcv),
+        'trades': len(trades),
+        'long_trades': int((trades['side'] > 0).sum()),
+        'short_trades': int((trades['side'] < 0).sum()),
+        'win_rate': float((trades['pnl'] > 0).mean() * 100) if len(trades) else 0.0,
+        'pnl': pnl,
+        'return_pct': pnl / initial_capital * 100,
+        'max_drawdown_pct': float(drawdown.max()),
+        'orders_placed': orders_placed,
+        'fill_rate_pct': len(trades) / orders_placed * 100 if orders_placed else 0.0,
+        'avg_holding_bars': float((trades['exit_bar'] - trades['entry_bar']).mean()) if len(trades) else 0.0,
+        'exit_reasons': {reason: int((trades['reason'] == i).sum()) for i, reason in enumerate(EXIT_REASONS)},
+        'trade_log': trades,
+    }
+
+def trail_params(config) -> dict:
+    keys = [
+        'stop_loss_pct', 'low_trail_stop_loss_pct', 'trail_stop_loss_pct', 'higher_trail_stop_loss_pct',
+        'low_trail_enable_threshold', 'first_trail_enable_threshold', 'second_trail_enable_threshold',
+    ]
+    return {key: float(config[key]) for key in keys}
+
+def format_report(pair:str, report:dict) -> str:
+    reasons = '，'.join(f'{k}: {v}' for k, v in report['exit_reasons'].items())
+    return '\n'.join([
+        f"回測 {pair.split(':')[0]}：共 {report['bars']} 根K線",
+        f"成交筆數：{report['trades']}（多 {report['long_trades']} / 空 {report['short_trades']}），成交率：{report['fill_rate_pct']:.2f}%",
+        f"勝率：{report['win_rate']:.1f}%，平均持倉：{report['avg_holding_bars']:.1f} 根",
+        f"總收益：{report['pnl']:.3f} USDT（{report['return_pct']:.2f}%），最大回撤：{report['max_drawdown_pct']:.2f}%",
+        f"出場原因：{reasons}",
+    ])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='以歷史 1m K線回測掛單策略與移動止盈規則')
+    parser.add_argument('data', help='OHLCV 檔案（.csv 或 .npy）；搭配 --download 時為輸出路徑')
+    parser.add_argument('--pair', required=True)
+    parser.add_argument('--config-dir', default=CONFIG_DIR)
+    parser.add_argument('--capital', type=float, default=1000.0)
+    parser.add_argument('--download', metavar='YYYY-MM-DD', help='先從 Bybit 下載自指定日期起的 1m K線')
+    args = parser.parse_args()
+
+    config = load_config(args.config_dir)
+
+    if args.download:
+        import ccxt
+        exc = ccxt.bybit(config=config["api"]["bybit"])
+        since = int(datetime.datetime.strptime(args.download, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+        np.save(args.data, download_ohlcv(exc, args.pair, since))
+
+    ohlcv = load_ohlcv(args.data if not args.download or args.data.endswith('.npy') else args.data + '.npy')
+    pair_config = config["trading_pairs"].get(args.pair, {})
+
+    started = time.perf_counter()
+    report = run_backtest(ohlcv, pair_config, trail_params(config), int(config["leverage"]), initial_capital=args.capital)
+    print(format_report(args.pair, report))
+    print(f"耗時：{time.perf_counter() - started:.2f} 秒")
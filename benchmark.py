@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# 以 MockBybit 量測兩個機器人的每輪耗時、每輪請求數與每個交易對/倉位的 CPU 時間
+# 用法：python benchmark.py --sizes 1 10 100 500 --cycles 3 --latency 0.05
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+# 以已安裝的 ./configs 建立設定時覆寫的欄位：不帶出金鑰，也不發送通知、連線 WebSocket、開啟指標端點或錄製流量
+SAFE_OVERRIDES = {
+    "telegram_notify": False,
+    "streaming": False,
+    "strategy_metrics_port": 0,
+    "trail_metrics_port": 0,
+    "strategy_record_path": "",
+    "trail_record_path": "",
+    "universe": {"enabled": False},
+}
+
+def _sanitize(data:dict) -> dict:
+    for key, value in SAFE_OVERRIDES.items():
+        if key in data:
+            data[key] = {**data[key], **value} if isinstance(value, dict) else value
+    api = data.get("api")
+    if api is not None:
+        api["bybit"] = {**api.get("bybit", {}), "apiKey": "", "secret": ""}
+        api["telegram"] = {**api.get("telegram", {}), "key": "", "chat_id": ""}
+    return data
+
+def prepare_workdir() -> str:
+    # 機器人於 import 時讀取 ./configs，因此在暫存目錄建立設定檔後切換過去
+    # 優先使用範本；執行過 fast_setup.py 後範本目錄已更名為 configs，改以其內容去除金鑰與對外功能後使用
+    workdir = tempfile.mkdtemp(prefix='bybit-bench-')
+    os.makedirs(os.path.join(workdir, 'configs'))
+    source_dir = os.path.join(REPO_DIR, 'configs.template')
+    if not os.path.isdir(source_dir):
+        source_dir = os.path.join(REPO_DIR, 'configs')
+    for filename in os.listdir(source_dir):
+        if not filename.endswith(('.json', '.json.template')):
+            continue
+        with open(os.path.join(source_dir, filename), 'r') as F:
+            data = _sanitize(json.load(F))
+        with open(os.path.join(workdir, 'configs', filename.replace('.template', '')), 'w') as F:
+            json.dump(data, F)
+    os.chdir(workdir)
+    return workdir
+
+def make_session(mock, unlimited:bool):
+    from exchange_session import ExchangeSession
+    from ratelimit import RateLimiter
+    limiter = RateLimiter(1e9, 1e9, {}) if unlimited else RateLimiter()
+    return ExchangeSession(mock, limiter)
+
+def symbols(n:int) -> list[str]:
+    return [f'P{i:03d}/USDT:USDT' for i in range(n)]
+
+async def bench_strategy(n:int, cycles:int, latency:float, unlimited:bool) -> dict:
+    import strategy_bybit
+    from mock_exchange import MockBybit, MINUTE
+
+    pairs = symbols(n)
+    mock = MockBybit(pairs, latency=latency, clock=int(time.time() * 1000))
+    strategy_bybit.config = strategy_bybit.config.new_child({
+        "trading_pairs": {pair: {"long_amount_usdt": 30, "short_amount_usdt": 30, "value_multiplier": 3, "ema": 240} for pair in pairs},
+        "max_concurrency": max(10, n),
+    })
+
+    bot = strategy_bybit.Bot(make_session(mock, unlimited))
+    bot.semaphore = asyncio.Semaphore(bot.max_concurrency)
+    await bot._initialize()
+
+    durations, requests, cpu = [], [], []
+    try:
+        for _ in range(cycles):
+            mock.advance(MINUTE)
+            calls = sum(mock.calls.values())
+            cpu_started = time.process_time()
+            started = time.perf_counter()
+            await bot._run_cycle()
+            durations.append(time.perf_counter() - started)
+            cpu.append(time.process_time() - cpu_started)
+            requests.append(sum(mock.calls.values()) - calls)
+    finally:
+        bot.markets.stop()
+
+    return report(n, durations, requests, cpu)
+
+async def bench_trail(n:int, cycles:int, latency:float, unlimited:bool) -> dict:
+    import trail_bybit
+    from mock_exchange import MockBybit
+
+    pairs = symbols(n)
+    mock = MockBybit(pairs, latency=latency, clock=int(time.time() * 1000))
+    for i, pair in enumerate(pairs):
+        mock.open_position(pair, 'long' if i % 2 == 0 else 'short', 100)
+    trail_bybit.config = trail_bybit.config.new_child({"blacklist": []})
+
+    bot = trail_bybit.Bot(make_session(mock, unlimited))
+
+    durations, requests, cpu = [], [], []
+    for _ in range(cycles):
+        mock.advance(1000)
+        calls = sum(mock.calls.values())
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        await bot.monitor_position()
+        durations.append(time.perf_counter() - started)
+        cpu.append(time.process_time() - cpu_started)
+        requests.append(sum(mock.calls.values()) - calls)
+
+    return report(n, durations, requests, cpu)
+
+def report(n:int, durations:list, requests:list, cpu:list) -> dict:
+    return {
+        'size': n,
+        'cycle_mean': statistics.mean(durations),
+        'cycle_max': max(durations),
+        'requests': statistics.mean(requests),
+        'cpu_per_item_ms': statistics.mean(cpu) / n * 1000,
+    }
+
+def print_table(title:str, rows:list[dict]):
+    print(title)
+    print(f"{'數量':>6} {'平均每輪(s)':>12} {'最長每輪(s)':>12} {'每輪請求數':>10} {'每項CPU(ms)':>12}")
+    for row in rows:
+        print(f"{row['size']:>6} {row['cycle_mean']:>12.3f} {row['cycle_max']:>12.3f} {row['requests']:>10.1f} {row['cpu_per_item_ms']:>12.3f}")
+
+async def main(args):
+    # 機器人模組 import 時會設定 logger，之後再調高等級以免輸出干擾量測
+    import strategy_bybit, trail_bybit
+    logging.getLogger('logger').setLevel(logging.WARNING)
+    results = {'strategy': [], 'trail': []}
+    for n in args.sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if 'strategy' in args.bots:
+                results['strategy'].append(await bench_strategy(n, args.cycles, args.latency, args.unlimited))
+            if 'trail' in args.bots:
+                results['trail'].append(await bench_trail(n, args.cycles, args.latency, args.unlimited))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='以模擬交易所量測機器人每輪延遲')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 500])
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.05, help='模擬每次請求的網路延遲（秒）')
+    parser.add_argument('--unlimited', action='store_true', help='停用限流，只量測程式本身')
+    parser.add_argument('--bots', nargs='+', default=['strategy', 'trail'], choices=['strategy', 'trail'])
+    parser.add_argument('--json', help='另存結果為 JSON')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.json) if args.json else None
+    workdir = prepare_workdir()
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if results['strategy']:
+        print_table('strategy_bybit.Bot._run_cycle', results['strategy'])
+    if results['trail']:
+        print_table('trail_bybit.Bot.monitor_position', results['trail'])
+    if output:
+        with open(output, 'w') as F:
+            json.dump(results, F, indent=4)
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+
+import aiohttp
+
+PUBLIC_URL = 'wss://stream.bybit.com/v5/public/linear'
+PRIVATE_URL = 'wss://stream.bybit.com/v5/private'
+DEMO_PRIVATE_URL = 'wss://stream-demo.bybit.com/v5/private'
+PING_INTERVAL = 20
+
+class StreamClosed(Exception):
+    pass
+
+class BybitStream:
+    # Bybit V5 WebSocket：私有 position 頻道與公開 tickers 頻道
+    # on_position(list[dict]) 與 on_ticker(dict) 會在每則推播到達時被呼叫
+    def __init__(self, api_key:str, secret:str, on_position, on_ticker, public_url:str = PUBLIC_URL, private_url:str = PRIVATE_URL, record_path:str | None = None):
+        self.api_key = api_key
+        self.secret = secret
+        self.on_position = on_position
+        self.on_ticker = on_ticker
+        self.public_url = public_url
+        self.private_url = private_url
+        self.record_path = record_path
+
+        self.subscribed: set[str] = set()
+        self._public: aiohttp.ClientWebSocketResponse | None = None
+        self._private: aiohttp.ClientWebSocketResponse | None = None
+        self._record = None
+
+    def _auth_args(self) -> list:
+        expires = int((time.time() + 10) * 1000)
+        signature = hmac.new(self.secret.encode(), f'GET/realtime{expires}'.encode(), hashlib.sha256).hexdigest()
+        return [self.api_key, expires, signature]
+
+    async def subscribe_tickers(self, market_ids:list[str]):
+        topics = [f'tickers.{market_id}' for market_id in market_ids if f'tickers.{market_id}' not in self.subscribed]
+        if not topics:
+            return
+        self.subscribed.update(topics)
+        if self._public is not None and not self._public.closed:
+            await self._public.send_json({'op': 'subscribe', 'args': topics})
+
+    async def run(self):
+        # 持續接收推播直到任一連線中斷，中斷時拋出 StreamClosed 由呼叫端改用 REST 輪詢
+        if self.record_path:
+            self._record = open(self.record_path, 'a', encoding='utf-8')
+
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(self.private_url, heartbeat=None) as private, session.ws_connect(self.public_url, heartbeat=None) as public:
+                self._private, self._public = private, public
+                try:
+                    await private.send_json({'op': 'auth', 'args': self._auth_args()})
+                    await private.send_json({'op': 'subscribe', 'args': ['position']})
+                    if self.subscribed:
+                        await public.send_json({'op': 'subscribe', 'args': sorted(self.subscribed)})
+
+                    tasks = [
+                        asyncio.create_task(self._read(private, 'private')),
+                        asyncio.create_task(self._read(public, 'public')),
+                        asyncio.create_task(self._ping(private, public)),
+                    ]
+                    try:
+                        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        for task in tasks:
+                            task.cancel()
+                    for task in done:
+                        if task.exception() is not None:
+                            raise task.exception()
+                    raise StreamClosed('WebSocket 連線已關閉')
+                finally:
+                    self._private = self._public = None
+                    if self._record is not None:
+                        self._record.close()
+                        self._record = None
+
+    async def _ping(self, *sockets):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            for ws in sockets:
+                await ws.send_json({'op': 'ping'})
+
+    async def _read(self, ws:aiohttp.ClientWebSocketResponse, channel:str):
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                break
+            if self._record is not None:
+                self._record.write(json.dumps({'ts': time.time(), 'channel': channel, 'message': json.loads(msg.data)}, separators=(',', ':')) + '\n')
+            self._dispatch(json.loads(msg.data))
+
+    def _dispatch(self, message:dict):
+        if message.get('op') == 'auth' and not message.get('success', True):
+            raise StreamClosed(f"WebSocket 驗證失敗：{message.get('ret_msg')}")
+
+        topic = message.get('topic', '')
+        if topic == 'position':
+            self.on_position(message.get('data', []))
+        elif topic.startswith('tickers.'):
+            self.on_ticker(message.get('data', {}))
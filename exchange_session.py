@@ -0,0 +1,61 @@
+import time
+
+import ccxt.async_support as ccxt_async
+
+from ratelimit import RateLimiter
+
+class ExchangeSession:
+    # 非同步 ccxt 客戶端與共用限流器；所有交易所請求都經由 request() 送出
+    def __init__(self, exc, limiter:RateLimiter | None = None, metrics=None):
+        self.exc = exc
+        self.limiter = limiter or RateLimiter()
+        self.instrument(metrics)
+
+    def instrument(self, metrics):
+        # 記錄各端點的請求延遲、次數、限流等待時間與令牌桶剩餘比例
+        self.metrics = metrics
+        if metrics is None:
+            return
+        self.request_seconds = metrics.histogram('request_seconds', 'Bybit 請求延遲（秒）')
+        self.requests_total = metrics.counter('requests_total', 'Bybit 請求次數')
+        self.ratelimit_wait_seconds = metrics.histogram('ratelimit_wait_seconds', '等待限流令牌的時間（秒）')
+        metrics.gauge('ratelimit_headroom', '限流令牌桶剩餘比例', self.limiter.headroom)
+
+    def with_metrics(self, metrics) -> 'ExchangeSession':
+        # 共用同一個客戶端與限流器，請求量測則寫入呼叫端自己的 metrics；同一進程的兩個機器人各取一份，避免互相覆寫
+        return ExchangeSession(self.exc, self.limiter, metrics)
+
+    @classmethod
+    def bybit(cls, exchange_config:dict, demo_trade:bool = False, limiter:RateLimiter | None = None, record_path:str | None = None):
+        # 由 RateLimiter 依端點權重限流，因此關閉 ccxt 內建的節流避免重複等待
+        # record_path 設定時，所有請求與回應附加寫入該檔，可用 recorder.py 重播
+        exc = ccxt_async.bybit(config={**exchange_config, "enableRateLimit": False})
+        if demo_trade:
+            exc.enable_demo_trading(True)
+        if record_path:
+            from recorder import RecordingExchange
+            exc = RecordingExchange(exc, record_path)
+        return cls(exc, limiter)
+
+    async def request(self, method:str, *args, weight:float = 1, **kwargs):
+        if self.metrics is None:
+            await self.limiter.acquire(method, weight)
+            return await getattr(self.exc, method)(*args, **kwargs)
+
+        started = time.perf_counter()
+        await self.limiter.acquire(method, weight)
+        acquired = time.perf_counter()
+        self.ratelimit_wait_seconds.observe(acquired - started, method=method)
+
+        status = 'ok'
+        try:
+            return await getattr(self.exc, method)(*args, **kwargs)
+        except Exception as e:
+            status = 'error'
+            raise
+        finally:
+            self.request_seconds.observe(time.perf_counter() - acquired, method=method)
+            self.requests_total.inc(method=method, status=status)
+
+    async def close(self):
+        await self.exc.close()
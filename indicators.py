@@ -0,0 +1,236 @@
+from collections import deque
+import math
+
+from kline_buffer import Resampler
+
+class RollingSum:
+    # 固定長度視窗的滾動加總，每 `maxlen` 次更新以 fsum 重新計算一次以避免浮點誤差累積
+    def __init__(self, maxlen:int):
+        self.maxlen = maxlen
+        self.values: deque[float] = deque(maxlen=maxlen)
+        self.total = 0.0
+        self._updates = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def full(self) -> bool:
+        return len(self.values) == self.maxlen
+
+    def push(self, value:float):
+        if self.full:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+
+        self._updates += 1
+        if self._updates >= self.maxlen:
+            self.total = math.fsum(self.values)
+            self._updates = 0
+
+    def peek(self, value:float) -> float:
+        # 加入 `value` 後的總和，但不寫入視窗
+        return self.total - (self.values[0] if self.full else 0.0) + value
+
+class WindowedEma:
+    # 只以最近 `maxlen` 根收盤價、並以視窗第一根為起點的 EMA，等同對固定長度的K線呼叫 ewm(span=period, adjust=False)
+    # 維護加權和 S = Σ b^(n-1-k)·c_k（b = 1 - alpha），EMA = alpha·S + b^n·c_0；視窗滑動時扣除離開的一項
+    # 每 `maxlen` 次更新重新計算一次加權和以避免浮點誤差累積
+    def __init__(self, period:int, maxlen:int):
+        self.alpha = 2 / (period + 1)
+        self.decay = 1 - self.alpha
+        self.maxlen = maxlen
+        self.values: deque[float] = deque(maxlen=maxlen)
+        self.weighted = 0.0
+        self._leaving = self.decay ** maxlen
+        self._updates = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, close:float):
+        if len(self.values) == self.maxlen:
+            self.weighted = self.decay * self.weighted + close - self._leaving * self.values[0]
+        else:
+            self.weighted = self.decay * self.weighted + close
+        self.values.append(close)
+
+        self._updates += 1
+        if self._updates >= self.maxlen:
+            n = len(self.values)
+            self.weighted = math.fsum(self.decay ** (n - 1 - k) * c for k, c in enumerate(self.values))
+            self._updates = 0
+
+    @property
+    def value(self) -> float | None:
+        if not self.values:
+            return None
+        return self.alpha * self.weighted + self.decay ** len(self.values) * self.values[0]
+
+class IndicatorEngine:
+    # 每個交易對一個實例，每根K線收盤時以 O(1) 更新 EMA、TR 滾動加總與振幅滾動加總
+    # 指定 window（含尚未收盤的一根，即 fetch_ohlcv 的 limit）時，數值與每輪對最近 window 根K線重新計算
+    # ewm(span=ema_period, adjust=False)、最近 atr_period 個 TR 與最近 amplitude_period 根振幅的平均相同；未指定時 EMA 沿整段歷史持續計算
+    def __init__(self, ema_period:int=240, atr_period:int=60, amplitude_period:int=60, window:int | None = None):
+        self.ema_period = int(ema_period)
+        self.atr_period = int(atr_period)
+        self.amplitude_period = int(amplitude_period)
+        self.alpha = 2 / (self.ema_period + 1) if self.ema_period > 0 else None
+        self.window = WindowedEma(self.ema_period, max(int(window) - 1, 1)) if window and self.alpha else None
+
+        self.ema: float | None = None
+        self.last_close: float | None = None
+        self.last_timestamp: int | None = None
+        self.trs = RollingSum(self.atr_period)
+        self.amplitudes = RollingSum(self.amplitude_period)
+
+    def _ema_step(self, close:float) -> float | None:
+        if self.alpha is None:
+            return None
+        if self.ema is None:
+            return close
+        return self.alpha * close + (1 - self.alpha) * self.ema
+
+    @staticmethod
+    def _true_range(high:float, low:float, prev_close:float | None) -> float | None:
+        if prev_close is None:
+            return None
+        return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+    def update(self, kline:list):
+        # 加入一根已收盤的K線
+        if self.last_timestamp is not None and kline[0] <= self.last_timestamp:
+            return
+        high, low, close = float(kline[2]), float(kline[3]), float(kline[4])
+
+        tr = self._true_range(high, low, self.last_close)
+        if tr is not None:
+            self.trs.push(tr)
+        self.amplitudes.push((high - low) / close * 100)
+        if self.window is None:
+            self.ema = self._ema_step(close)
+        else:
+            self.window.push(close)
+            self.ema = self.window.value
+
+        self.last_close = close
+        self.last_timestamp = kline[0]
+
+    def extend(self, klines:list[list]):
+        for kline in klines:
+            self.update(kline)
+
+    def to_state(self) -> dict:
+        return {
+            'ema': self.ema,
+            'last_close': self.last_close,
+            'last_timestamp': self.last_timestamp,
+            'trs': list(self.trs.values),
+            'amplitudes': list(self.amplitudes.values),
+            'window': list(self.window.values) if self.window is not None else None,
+        }
+
+    def restore(self, state:dict):
+        self.ema = state['ema']
+        self.last_close = state['last_close']
+        self.last_timestamp = state['last_timestamp']
+        for value in state['trs']:
+            self.trs.push(value)
+        for value in state['amplitudes']:
+            self.amplitudes.push(value)
+        if self.window is not None:
+            for close in state.get('window') or []:
+                self.window.push(close)
+            self.ema = self.window.value
+
+    def values(self, forming:list | None = None) -> tuple[float | None, float, float, float | None]:
+        # 回傳 (ema, atr, 平均振幅, 最新收盤價)，若有尚未收盤的K線則一併計入但不寫入狀態
+        if forming is None:
+            amplitude = self.amplitudes.total / len(self.amplitudes) if len(self.amplitudes) else 0.0
+            return self.ema, self.trs.total / self.atr_period, amplitude, self.last_close
+
+        high, low, close = float(forming[2]), float(forming[3]), float(forming[4])
+
+        tr = self._true_range(high, low, self.last_close)
+        tr_total = self.trs.total if tr is None else self.trs.peek(tr)
+        amplitude_total = self.amplitudes.peek((high - low) / close * 100)
+        amplitude_count = min(len(self.amplitudes) + 1, self.amplitude_period)
+
+        return self._ema_step(close), tr_total / self.atr_period, amplitude_total / amplitude_count, close
+
+class TimeframeIndicators:
+    # 每個交易對一個實例：EMA 與 ATR/平均振幅可各自指定時間週期，較高週期以 Resampler 由基礎週期K線遞增合成
+    # 兩者週期相同時共用同一個 IndicatorEngine，全部為基礎週期時與單一 IndicatorEngine 完全相同
+    # window 只套用於基礎週期；較高週期以 seed 暖機後沿整段歷史持續計算
+    def __init__(self, ema_period:int=240, ema_timeframe:str='1m', atr_timeframe:str='1m', base:str='1m', window:int | None = None):
+        self.ema_period = int(ema_period)
+        self.ema_timeframe = ema_timeframe
+        self.atr_timeframe = atr_timeframe
+        def engine(ema_period:int, timeframe:str) -> IndicatorEngine:
+            return IndicatorEngine(ema_period, window=window if timeframe == base else None)
+        self.engines = {ema_timeframe: engine(self.ema_period, ema_timeframe)}
+        if atr_timeframe not in self.engines:
+            self.engines[atr_timeframe] = engine(0, atr_timeframe)
+        self.resamplers = {timeframe: Resampler(timeframe, base) for timeframe in self.engines if timeframe != base}
+        self.window = window
+
+    @property
+    def key(self) -> tuple[int, str, str]:
+        return self.ema_period, self.ema_timeframe, self.atr_timeframe
+
+    def warmup(self, timeframe:str) -> int:
+        # 暖機該週期需要的K線數（含尚未收盤的一根）
+        engine = self.engines[timeframe]
+        ema_period = engine.ema_period if timeframe == self.ema_timeframe else 0
+        return max(ema_period, engine.atr_period, engine.amplitude_period) + 2
+
+    def to_state(self) -> dict:
+        return {
+            'key': list(self.key),
+            'window': self.window,
+            'engines': {timeframe: engine.to_state() for timeframe, engine in self.engines.items()},
+            'resamplers': {timeframe: resampler.to_state() for timeframe, resampler in self.resamplers.items()},
+        }
+
+    def restore(self, state:dict | None) -> bool:
+        # 還原快照中的指標狀態；設定已變更（週期、時間週期或視窗長度不同）時回傳 False，由呼叫端重新建立
+        if not state or tuple(state['key']) != self.key or state.get('window') != self.window:
+            return False
+        if set(state['engines']) != set(self.engines) or set(state['resamplers']) != set(self.resamplers):
+            return False
+        for timeframe, engine in self.engines.items():
+            engine.restore(state['engines'][timeframe])
+        for timeframe, resampler in self.resamplers.items():
+            resampler.restore(state['resamplers'][timeframe])
+        return True
+
+    def seed(self, timeframe:str, ohlcv:list[list], now_ms:int):
+        self.engines[timeframe].extend(self.resamplers[timeframe].seed(ohlcv, now_ms))
+
+    def extend(self, klines:list[list]):
+        # 加入已收盤的基礎週期K線
+        for timeframe, engine in self.engines.items():
+            resampler = self.resamplers.get(timeframe)
+            engine.extend(klines if resampler is None else resampler.extend(klines))
+
+    def values(self, forming:list | None = None) -> tuple[float | None, float, float, float | None]:
+        # 與 IndicatorEngine.values 相同：(ema, atr, 平均振幅, 最新收盤價)
+        results = {}
+        for timeframe, engine in self.engines.items():
+            resampler = self.resamplers.get(timeframe)
+            results[timeframe] = engine.values(forming if resampler is None else resampler.forming(forming))
+        ema, _, _, last_close = results[self.ema_timeframe]
+        _, atr, average_amplitude, _ = results[self.atr_timeframe]
+        return ema, atr, average_amplitude, last_close
+
+def target_prices(mark_price, atr, average_amplitude, value_multiplier):
+    # 掛單目標價：ATR 比率與平均振幅的平均乘上倍數後，作為偏離標記價格的百分比
+    # 參數可為純量或 numpy 陣列
+    price_atr_ratio = (atr / mark_price) * 100
+    selected_value = (average_amplitude + price_atr_ratio)/2 * value_multiplier
+
+    long_price_factor = 1 - selected_value / 100
+    short_price_factor = 1 + selected_value / 100
+
+    return mark_price * long_price_factor, mark_price * short_price_factor
@@ -0,0 +1,192 @@
+from collections import deque
+
+TIMEFRAME_MS = {
+    '1m': 60_000,
+    '3m': 180_000,
+    '5m': 300_000,
+    '15m': 900_000,
+    '30m': 1_800_000,
+    '1h': 3_600_000,
+    '2h': 7_200_000,
+    '4h': 14_400_000,
+    '6h': 21_600_000,
+    '12h': 43_200_000,
+    '1d': 86_400_000,
+}
+
+MAX_FETCH_LIMIT = 1000  # Bybit kline endpoint 單次最多回傳筆數
+
+class KlineBuffer:
+    # 固定長度的 OHLCV 環形緩衝區：`bars` 只存已收盤的K線，`forming` 為尚未收盤的最後一根
+    # `maxlen` 與 fetch_ohlcv 的 limit 相同，包含尚未收盤的那根
+    def __init__(self, timeframe:str='1m', maxlen:int=241):
+        self.timeframe = timeframe
+        self.tf_ms = TIMEFRAME_MS[timeframe]
+        self.maxlen = maxlen
+        self.bars: deque[list] = deque(maxlen=max(maxlen - 1, 1))
+        self.forming: list | None = None
+
+    def __len__(self):
+        return len(self.bars) + (1 if self.forming is not None else 0)
+
+    @property
+    def seeded(self) -> bool:
+        return len(self.bars) > 0 or self.forming is not None
+
+    @property
+    def last_closed_timestamp(self) -> int | None:
+        return self.bars[-1][0] if self.bars else None
+
+    def since(self) -> int | None:
+        # 從尚未收盤的K線重新抓取，才能拿到它收盤後的最終數值
+        if self.forming is not None:
+            return self.forming[0]
+        if self.bars:
+            return self.bars[-1][0] + self.tf_ms
+        return None
+
+    def fetch_limit(self, now_ms:int) -> int | None:
+        # 回傳增量更新需要的筆數；若缺口超過緩衝區長度則回傳 None，代表需要重新初始化
+        since = self.since()
+        if since is None:
+            return None
+        needed = (now_ms - since) // self.tf_ms + 1
+        if needed > self.maxlen or needed > MAX_FETCH_LIMIT:
+            return None
+        return max(int(needed), 1)
+
+    def seed(self, ohlcv:list[list], now_ms:int) -> list[list]:
+        self.bars.clear()
+        self.forming = None
+        return self.merge(ohlcv, now_ms)
+
+    def merge(self, ohlcv:list[list], now_ms:int) -> list[list]:
+        # 合併新抓取的K線，回傳本次新收盤的K線（依時間排序）
+        closed = []
+        last_ts = self.last_closed_timestamp
+        forming = None
+
+        for bar in sorted(ohlcv, key=lambda b: b[0]):
+            ts = bar[0]
+            if last_ts is not None and ts <= last_ts:
+                continue    # 已收盤的K線不會再變動
+            if ts + self.tf_ms > now_ms:
+                forming = bar
+                break
+            self.bars.append(bar)
+            closed.append(bar)
+            last_ts = ts
+
+        if forming is not None:
+            self.forming = forming
+        elif self.forming is not None and last_ts is not None and self.forming[0] <= last_ts:
+            self.forming = None
+
+        return closed
+
+    def to_state(self) -> dict:
+        return {'timeframe': self.timeframe, 'maxlen': self.maxlen, 'bars': list(self.bars), 'forming': self.forming}
+
+    @classmethod
+    def from_state(cls, state:dict) -> 'KlineBuffer':
+        buffer = cls(state['timeframe'], int(state['maxlen']))
+        buffer.bars.extend(state['bars'])
+        buffer.forming = state.get('forming')
+        return buffer
+
+    def klines(self) -> list[list]:
+        klines = list(self.bars)
+        if self.forming is not None:
+            klines.append(self.forming)
+        return klines
+
+class Resampler:
+    # 以已收盤的基礎週期K線（1m）遞增合成較高週期的K線，起點對齊 UTC 時間（與交易所相同）
+    # 該週期最後一根基礎K線收盤時即輸出；基礎K線中斷而跨入下一週期時，未湊齊的那根也照常輸出
+    def __init__(self, timeframe:str, base:str='1m'):
+        self.timeframe = timeframe
+        self.tf_ms = TIMEFRAME_MS[timeframe]
+        self.base_ms = TIMEFRAME_MS[base]
+        if self.tf_ms % self.base_ms:
+            raise ValueError(f'{timeframe} 不是 {base} 的整數倍')
+        self.partial: list | None = None
+        self.cutoff: int | None = None              # 在此之前收盤的基礎K線已包含於暖機資料
+        self.last_timestamp: int | None = None      # 最後輸出的K線起點
+        self.last_base: int | None = None           # 最後併入的基礎K線起點，重複餵入時略過
+
+    def bucket(self, ts:int) -> int:
+        return ts - ts % self.tf_ms
+
+    def seed(self, ohlcv:list[list], now_ms:int) -> list[list]:
+        # 以交易所的該週期K線暖機，回傳已收盤的K線；尚未收盤的那根作為後續合成的起點
+        closed = []
+        self.partial = None
+        for bar in sorted(ohlcv, key=lambda b: b[0]):
+            if bar[0] + self.tf_ms > now_ms:
+                self.partial = [bar[0], *(float(v or 0) for v in bar[1:6])]
+                break
+            closed.append(bar)
+        self.cutoff = now_ms
+        self.last_timestamp = closed[-1][0] if closed else None
+        return closed
+
+    def _included(self, bar:list) -> bool:
+        return self.cutoff is not None and bar[0] + self.base_ms <= self.cutoff
+
+    def _close(self) -> list:
+        bar, self.partial = self.partial, None
+        self.last_timestamp = bar[0]
+        return bar
+
+    def update(self, bar:list) -> list[list]:
+        # 加入一根已收盤的基礎K線，回傳因此收盤的較高週期K線
+        start = self.bucket(bar[0])
+        if self._included(bar) or (self.last_timestamp is not None and start <= self.last_timestamp):
+            return []
+        if self.last_base is not None and bar[0] <= self.last_base:
+            return []
+        self.last_base = bar[0]
+
+        closed = []
+        if self.partial is not None and self.partial[0] != start:
+            closed.append(self._close())
+
+        high, low, close, volume = float(bar[2]), float(bar[3]), float(bar[4]), float(bar[5] or 0)
+        if self.partial is None:
+            self.partial = [start, float(bar[1]), high, low, close, volume]
+        else:
+            partial = self.partial
+            partial[2] = max(partial[2], high)
+            partial[3] = min(partial[3], low)
+            partial[4] = close
+            partial[5] += volume
+
+        if bar[0] + self.base_ms >= start + self.tf_ms:
+            closed.append(self._close())
+        return closed
+
+    def to_state(self) -> dict:
+        return {'partial': self.partial, 'cutoff': self.cutoff, 'last_timestamp': self.last_timestamp, 'last_base': self.last_base}
+
+    def restore(self, state:dict):
+        self.partial = list(state['partial']) if state.get('partial') else None
+        self.cutoff = state.get('cutoff')
+        self.last_timestamp = state.get('last_timestamp')
+        self.last_base = state.get('last_base')
+
+    def extend(self, bars:list[list]) -> list[list]:
+        closed = []
+        for bar in bars:
+            closed.extend(self.update(bar))
+        return closed
+
+    def forming(self, base:list | None = None) -> list | None:
+        # 尚未收盤的較高週期K線，併入尚未收盤的基礎K線 `base`，不寫入狀態
+        if base is None or self._included(base):
+            return self.partial
+        start = self.bucket(base[0])
+        high, low, close = float(base[2]), float(base[3]), float(base[4])
+        if self.partial is None or self.partial[0] != start:
+            return [start, float(base[1]), high, low, close, float(base[5] or 0)]
+        partial = self.partial
+        return [start, partial[1], max(partial[2], high), min(partial[3], low), close, partial[5] + float(base[5] or 0)]
@@ -0,0 +1,105 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+
+# 無終端機（systemd、docker、nohup）時 os.get_terminal_size() 會拋出例外，改用預設寬度
+DIVIDER = '=' * shutil.get_terminal_size((80, 24)).columns
+
+LOGGER_NAME = 'logger'
+
+class JsonFormatter(logging.Formatter):
+    # 每筆一行的精簡 JSON，供事後以程式分析；extra 傳入的 pair 等欄位一併輸出
+    FIELDS = ('pair', 'side', 'order_id', 'event')
+
+    def format(self, record:logging.LogRecord) -> str:
+        entry = {'ts': round(record.created, 3), 'level': record.levelname, 'msg': record.getMessage()}
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+class PairRateLimitFilter(logging.Filter):
+    # 帶有 pair 欄位的 DEBUG 訊息，同一交易對同一行程式碼每 interval 秒最多一筆，其餘丟棄並於下一筆註明略過筆數
+    def __init__(self, interval:float):
+        super().__init__()
+        self.interval = float(interval)
+        self._last: dict[tuple, float] = {}
+        self._suppressed: dict[tuple, int] = {}
+
+    def filter(self, record:logging.LogRecord) -> bool:
+        pair = getattr(record, 'pair', None)
+        if pair is None or record.levelno > logging.DEBUG or self.interval <= 0:
+            return True
+
+        key = (pair, record.pathname, record.lineno)
+        now = time.monotonic()
+        if now - self._last.get(key, -self.interval) < self.interval:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+
+        self._last[key] = now
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = f'{record.msg}（前 {self.interval:.0f} 秒略過 {suppressed} 筆）'
+        return True
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    # 佇列只在同一進程內傳遞，紀錄不必序列化：原樣放入佇列，訊息合併與例外堆疊的格式化都留給背景執行緒，
+    # 並保留 exc_info 供各 formatter（含 JsonFormatter 的 exc 欄位）輸出
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def _file_handler(path:str, config) -> logging.Handler:
+    # log_rotate_when（例如 "midnight"、"H"）設定時依時間輪替，否則依 log_max_bytes 大小輪替
+    when = config.get("log_rotate_when")
+    backups = int(config.get("log_backup_count", 5))
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups, encoding="utf-8")
+    return logging.handlers.RotatingFileHandler(path, maxBytes=int(config.get("log_max_bytes", 10_000_000)), backupCount=backups, encoding="utf-8")
+
+def setup_logging(log_file:str, config) -> logging.Logger:
+    # 呼叫端只把紀錄放進佇列，格式化與終端機、檔案 I/O 都在背景執行緒的 QueueListener 中進行
+    logger = logging.getLogger(LOGGER_NAME)
+    if logger.handlers:
+        return logger   # 同一進程中已由其他模組設定
+    logger.setLevel(logging.DEBUG)
+
+    os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+
+    formatter = logging.Formatter(
+        "[%(asctime)s][%(levelname)s] %(message)s",
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(formatter)
+
+    file_handler = _file_handler(log_file, config)
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(formatter)
+
+    handlers = [console_handler, file_handler]
+    if config.get("log_json", False):
+        json_handler = _file_handler(f'{os.path.splitext(log_file)[0]}.jsonl', config)
+        json_handler.setLevel(logging.DEBUG)
+        json_handler.setFormatter(JsonFormatter())
+        handlers.append(json_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    queue_handler.addFilter(PairRateLimitFilter(float(config.get("log_debug_interval", 60))))
+    logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return logger
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from typing import NamedTuple
+
+logger = logging.getLogger('logger')
+
+class MarketInfo(NamedTuple):
+    symbol: str
+    min_amount: float
+    tick_size: float
+    lot_step: float
+
+def build_market_index(markets:dict) -> dict[str, MarketInfo]:
+    # Bybit 使用 TICK_SIZE 精度模式，precision 欄位即為最小跳動單位
+    index = {}
+    for symbol, market in markets.items():
+        try:
+            precision = market.get('precision') or {}
+            lot_step = float(precision.get('amount') or 0)
+            min_amount = float(market['limits']['amount']['min'] or lot_step)
+            index[symbol] = MarketInfo(
+                symbol=symbol,
+                min_amount=min_amount,
+                tick_size=float(precision.get('price') or 0),
+                lot_step=lot_step or min_amount,
+            )
+        except (KeyError, TypeError, ValueError):
+            continue
+    return index
+
+class MarketCache:
+    # 進程內的市場資訊快取：逾時（ttl 秒）或被標記失效時才重新呼叫 load_markets(True)
+    # 單一交易對的失效標記在上次載入後 min_reload_interval 秒內會被忽略，避免持續被拒的訂單每輪都觸發完整重新載入
+    def __init__(self, exc, ttl:float=3600, min_reload_interval:float=300):
+        self.exc = exc
+        self.ttl = float(ttl)
+        self.min_reload_interval = float(min_reload_interval)
+        self._index: dict[str, MarketInfo] = {}
+        self._loaded_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def stale(self) -> bool:
+        return time.monotonic() - self._loaded_at >= self.ttl
+
+    async def _load(self):
+        markets = await self.exc.load_markets(True)
+        self._index = build_market_index(markets)
+        self._loaded_at = time.monotonic()
+
+    async def refresh(self):
+        async with self._refresh_lock:
+            await self._load()
+
+    def restore(self, markets:dict, age:float = 0.0):
+        # 由狀態快照還原；age 為快照距今秒數，逾時後照常重新載入
+        self._index = build_market_index(markets)
+        self._loaded_at = time.monotonic() - age
+
+    def invalidate(self, symbol:str | None = None) -> bool:
+        # 指定 symbol 時只移除該筆，下次讀取時會觸發重新載入；回傳是否確實標記失效
+        if symbol is None:
+            self._loaded_at = 0.0
+            return True
+        if time.monotonic() - self._loaded_at < self.min_reload_interval:
+            return False
+        return self._index.pop(symbol, None) is not None
+
+    async def get(self, symbol:str) -> MarketInfo:
+        info = self._index.get(symbol)
+        if info is None or self.stale:
+            async with self._refresh_lock:
+                # 多個交易對同時觸發時只重新載入一次
+                info = self._index.get(symbol)
+                if info is None or self.stale:
+                    await self._load()
+                    info = self._index[symbol]
+        return info
+
+    def start(self, interval:float | None = None):
+        # 背景任務定期刷新，讓下單路徑不必同步等待 load_markets
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._refresh_loop(interval or self.ttl / 2))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _refresh_loop(self, interval:float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f'背景更新市場資訊時發生錯誤：{e}')
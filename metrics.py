@@ -0,0 +1,195 @@
+import asyncio
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import threading
+import time
+
+logger = logging.getLogger('logger')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# render() 在 HTTP 執行緒中執行，事件迴圈同時可能新增標籤組合；先以 list() 複製（CPython 下於 GIL 內一次完成）再走訪，
+# 避免 "dictionary changed size during iteration"，熱路徑的 inc/observe 則不必加鎖
+
+def _label_key(labels:dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key:tuple, extra:tuple = ()) -> str:
+    items = key + extra
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name:str, help:str):
+        self.name = name
+        self.help = help
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount:float = 1, **labels):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def render(self) -> list[str]:
+        return [f'{self.name}{_format_labels(key)} {value}' for key, value in list(self.values.items())]
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name:str, help:str, function=None):
+        # function 回傳 {labels(tuple): value}，於輸出時才計算
+        self.name = name
+        self.help = help
+        self.function = function
+        self.values: dict[tuple, float] = {}
+
+    def set(self, value:float, **labels):
+        self.values[_label_key(labels)] = value
+
+    def collect(self) -> dict[tuple, float]:
+        return self.function() if self.function is not None else self.values
+
+    def render(self) -> list[str]:
+        return [f'{self.name}{_format_labels(key)} {value}' for key, value in list(self.collect().items())]
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name:str, help:str, buckets:tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.series: dict[tuple, list] = {}   # labels -> [各區間次數..., 總和, 次數, 最大值]
+
+    def observe(self, value:float, **labels):
+        key = _label_key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * len(self.buckets) + [0.0, 0, 0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        n = len(self.buckets)
+        series[n] += value
+        series[n + 1] += 1
+        series[n + 2] = max(series[n + 2], value)
+
+    def stats(self, **labels) -> tuple[int, float, float]:
+        # (次數, 平均, 最大值)
+        series = self.series.get(_label_key(labels))
+        if not series:
+            return 0, 0.0, 0.0
+        n = len(self.buckets)
+        return series[n + 1], series[n] / series[n + 1], series[n + 2]
+
+    def render(self) -> list[str]:
+        lines = []
+        n = len(self.buckets)
+        for key, series in list(self.series.items()):
+            series = list(series)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series[:n]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(key, (("le", bound),))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(key, (("le", "+Inf"),))} {series[n + 1]}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {series[n]}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {series[n + 1]}')
+        return lines
+
+class Metrics:
+    # 熱路徑量測登錄表：以 Prometheus 文字格式輸出於本機 HTTP 端點，或定期寫入摘要日誌
+    def __init__(self, prefix:str):
+        self.prefix = prefix
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name:str, help:str) -> Counter:
+        return self._register(Counter(f'{self.prefix}_{name}', help))
+
+    def gauge(self, name:str, help:str, function=None) -> Gauge:
+        return self._register(Gauge(f'{self.prefix}_{name}', help, function))
+
+    def histogram(self, name:str, help:str, buckets:tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(f'{self.prefix}_{name}', help, buckets))
+
+    @contextmanager
+    def timer(self, histogram:Histogram, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def start_server(self, port:int, host:str = '127.0.0.1'):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f'效能指標端點：http://{host}:{port}/metrics')
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+    def summary(self) -> str:
+        # 單行摘要：週期耗時/超時次數、各端點請求次數與平均延遲、限流餘裕
+        parts = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            name = metric.name[len(self.prefix) + 1:]
+            if isinstance(metric, Histogram):
+                for key in metric.series:
+                    count, mean, peak = metric.stats(**dict(key))
+                    label = ','.join(str(v) for _, v in key)
+                    parts.append(f"{name}{'[' + label + ']' if label else ''} {count}次 平均{mean*1000:.1f}ms 最長{peak*1000:.1f}ms")
+            elif isinstance(metric, Counter) and not name.startswith('requests'):
+                parts.append(f'{name} {metric.total():g}')
+            elif isinstance(metric, Gauge):
+                values = metric.collect()
+                if values:
+                    parts.append(f'{name} 最低{min(values.values()):.2f}')
+        return ' | '.join(parts)
+
+    async def log_summary(self, interval:float):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f'效能摘要：{self.summary()}')
@@ -0,0 +1,260 @@
+import asyncio
+from collections import Counter
+import itertools
+import math
+import random
+import time
+
+from ccxt.base.errors import OrderNotFound, RateLimitExceeded
+
+from kline_buffer import TIMEFRAME_MS
+
+MINUTE = 60_000
+
+class MockBybit:
+    # 進程內模擬的 Bybit 永續合約交易所，介面與 ccxt.async_support.bybit 相容（僅實作兩個機器人用到的方法）
+    # 價格為每個交易對獨立的幾何布朗運動，或由 ohlcv 參數提供錄製好的 1m K線
+    # latency：每次請求延遲秒數（可為 {方法名: 秒數}）；rate_limit_error_rate：隨機拋出 RateLimitExceeded 的機率
+    def __init__(self, symbols:list[str], latency:float | dict = 0.0, rate_limit_error_rate:float = 0.0, ohlcv:dict[str, list[list]] | None = None, volatility:float = 0.0015, start:int | None = None, seed:int = 0, clock:int | None = None):
+        self.latency = latency
+        self.rate_limit_error_rate = rate_limit_error_rate
+        self.volatility = volatility
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.calls: Counter = Counter()
+
+        now = self.milliseconds()
+        self.start = start if start is not None else (now // MINUTE - 1440) * MINUTE
+        self.bars: dict[str, list[list]] = {}
+        for symbol in symbols:
+            if ohlcv and symbol in ohlcv:
+                self.bars[symbol] = [list(bar) for bar in ohlcv[symbol]]
+            else:
+                self.bars[symbol] = [[self.start, 1.0, 1.0, 1.0, 1.0, 0.0]]
+
+        self.markets = {symbol: self._market(symbol) for symbol in symbols}
+        self.markets_by_id = {market['id']: [market] for market in self.markets.values()}
+        self.leverages = {symbol: 10 for symbol in symbols}
+        self.orders: dict[str, dict] = {}
+        self.positions: dict[str, dict] = {}
+        self.balance = 10_000.0
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def _market(symbol:str) -> dict:
+        base, quote = symbol.split(':')[0].split('/')
+        return {
+            'id': f'{base}{quote}', 'symbol': symbol, 'base': base, 'quote': quote, 'settle': quote,
+            'type': 'swap', 'swap': True, 'linear': True, 'contract': True, 'active': True,
+            'precision': {'amount': 1.0, 'price': 0.0001},
+            'limits': {'amount': {'min': 1.0, 'max': None}, 'price': {'min': None, 'max': None}},
+        }
+
+    # 時間與價格
+    def milliseconds(self) -> int:
+        return self.clock if self.clock is not None else int(time.time() * 1000)
+
+    def advance(self, ms:int = MINUTE):
+        # 推進模擬時鐘並撮合已觸價的限價單
+        self.clock = self.milliseconds() + ms
+        for symbol in self.bars:
+            self._extend(symbol)
+        self._match_orders()
+
+    def _extend(self, symbol:str):
+        bars = self.bars[symbol]
+        now = self.milliseconds()
+        while bars[-1][0] + MINUTE <= now:
+            close = bars[-1][4]
+            ts = bars[-1][0] + MINUTE
+            new_close = close * math.exp(self.random.gauss(0, self.volatility))
+            high = max(close, new_close) * (1 + abs(self.random.gauss(0, self.volatility / 2)))
+            low = min(close, new_close) * (1 - abs(self.random.gauss(0, self.volatility / 2)))
+            bars.append([ts, close, high, low, new_close, self.random.uniform(1e3, 1e5)])
+
+    def price(self, symbol:str) -> float:
+        self._extend(symbol)
+        return self.bars[symbol][-1][4]
+
+    async def _request(self, method:str):
+        self.calls[method] += 1
+        latency = self.latency.get(method, 0.0) if isinstance(self.latency, dict) else self.latency
+        if latency:
+            await asyncio.sleep(latency)
+        if self.rate_limit_error_rate and self.random.random() < self.rate_limit_error_rate:
+            raise RateLimitExceeded(f'bybit {method} Too many visits!')
+
+    # 市場資訊
+    async def load_markets(self, reload:bool = False, params={}):
+        await self._request('load_markets')
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        markets = markets.values() if isinstance(markets, dict) else markets
+        self.markets.update({market['symbol']: market for market in markets})
+        self.markets_by_id = {market['id']: [market] for market in self.markets.values()}
+        return self.markets
+
+    def market(self, symbol:str) -> dict:
+        return self.markets[symbol]
+
+    def safe_market(self, market_id:str, market=None, delimiter=None, market_type=None) -> dict:
+        markets = self.markets_by_id.get(market_id)
+        return markets[0] if markets else {'id': market_id, 'symbol': market_id}
+
+    # 行情
+    def _ticker(self, symbol:str) -> dict:
+        # 24h 欄位以最新一根K線粗略外推，避免模擬器本身的 CPU 開銷干擾基準測試
+        price = self.price(symbol)
+        bar = self.bars[symbol][-1]
+        return {
+            'symbol': symbol, 'timestamp': self.milliseconds(),
+            'bid': price * 0.9999, 'ask': price * 1.0001, 'last': price, 'close': price, 'markPrice': price,
+            'high': bar[2], 'low': bar[3], 'baseVolume': bar[5] * 1440, 'quoteVolume': bar[5] * 1440 * price,
+            'info': {'symbol': self.markets[symbol]['id'], 'markPrice': str(price)},
+        }
+
+    async def fetch_ticker(self, symbol:str, params={}):
+        await self._request('fetch_ticker')
+        return self._ticker(symbol)
+
+    async def fetch_tickers(self, symbols:list[str] | None = None, params={}):
+        await self._request('fetch_tickers')
+        return {symbol: self._ticker(symbol) for symbol in (symbols or self.markets)}
+
+    async def fetch_ohlcv(self, symbol:str, timeframe:str = '1m', since:int | None = None, limit:int | None = None, params={}):
+        await self._request('fetch_ohlcv')
+        self._extend(symbol)
+        bars = self.bars[symbol]
+        if timeframe != '1m':
+            bars = self._resample(bars, TIMEFRAME_MS[timeframe])
+        if since is not None:
+            bars = [bar for bar in bars if bar[0] >= since]
+            return [list(bar) for bar in bars[:limit or 200]]
+        return [list(bar) for bar in bars[-(limit or 200):]]
+
+    @staticmethod
+    def _resample(bars:list[list], tf_ms:int) -> list[list]:
+        # 由 1m K線合成較高週期，起點對齊 UTC 時間
+        resampled = []
+        for ts, open_, high, low, close, volume in bars:
+            start = ts - ts % tf_ms
+            if resampled and resampled[-1][0] == start:
+                bar = resampled[-1]
+                bar[2], bar[3], bar[4], bar[5] = max(bar[2], high), min(bar[3], low), close, bar[5] + volume
+            else:
+                resampled.append([start, open_, high, low, close, volume])
+        return resampled
+
+    # 訂單
+    def _order(self, symbol:str, type:str, side:str, amount:float, price:float | None) -> dict:
+        return {
+            'id': str(next(self._ids)), 'symbol': symbol, 'type': type, 'side': side,
+            'amount': float(amount), 'price': price, 'status': 'open', 'filled': 0.0, 'remaining': float(amount),
+            'timestamp': self.milliseconds(),
+        }
+
+    def _fill(self, order:dict, price:float):
+        order.update(status='closed', filled=order['amount'], remaining=0.0, average=price)
+        signed = order['amount'] if order['side'] == 'buy' else -order['amount']
+        position = self.positions.get(order['symbol'])
+        size = position['signed'] if position else 0.0
+        new_size = size + signed
+        if abs(new_size) < 1e-12:
+            self.positions.pop(order['symbol'], None)
+            return
+        if position is None or size * signed > 0:
+            entry = ((position['avgPrice'] * abs(size)) if position else 0.0) + price * abs(signed)
+            avg = entry / abs(new_size)
+        elif size * new_size < 0:
+            avg = price
+        else:
+            avg = position['avgPrice']
+        self.positions[order['symbol']] = {'signed': new_size, 'avgPrice': avg}
+
+    def _match_orders(self):
+        for order in list(self.orders.values()):
+            bar = self.bars[order['symbol']][-1]
+            if (order['side'] == 'buy' and bar[3] <= order['price']) or (order['side'] == 'sell' and bar[2] >= order['price']):
+                self.orders.pop(order['id'])
+                self._fill(order, order['price'])
+
+    async def create_order(self, symbol:str, type:str, side:str, amount:float, price:float | None = None, params={}):
+        await self._request('create_order')
+        return self._create(symbol, type, side, amount, price)
+
+    def _create(self, symbol:str, type:str, side:str, amount:float, price:float | None) -> dict:
+        order = self._order(symbol, type, side, amount, price)
+        if type == 'market':
+            self._fill(order, self.price(symbol))
+        else:
+            self.orders[order['id']] = order
+        return order
+
+    async def create_orders(self, orders:list[dict], params={}):
+        await self._request('create_orders')
+        return [
+            self._create(o['symbol'], o['type'], o['side'], o['amount'], o.get('price'))
+            for o in orders
+        ]
+
+    async def edit_order(self, id:str, symbol:str, type:str, side:str, amount:float | None = None, price:float | None = None, params={}):
+        await self._request('edit_order')
+        order = self.orders.get(id)
+        if order is None:
+            raise OrderNotFound(f'bybit order {id} not exists')
+        if amount is not None:
+            order.update(amount=float(amount), remaining=float(amount))
+        if price is not None:
+            order['price'] = price
+        return order
+
+    async def fetch_open_orders(self, symbol:str | None = None, since=None, limit=None, params={}):
+        await self._request('fetch_open_orders')
+        return [dict(o) for o in self.orders.values() if symbol is None or o['symbol'] == symbol]
+
+    async def cancel_order(self, id:str, symbol:str | None = None, params={}):
+        await self._request('cancel_order')
+        if self.orders.pop(id, None) is None:
+            raise OrderNotFound(f'bybit order {id} not exists')
+        return {'id': id, 'status': 'canceled'}
+
+    async def cancel_orders(self, ids:list[str], symbol:str | None = None, params={}):
+        await self._request('cancel_orders')
+        return [{'id': id, 'status': 'canceled' if self.orders.pop(id, None) else 'rejected'} for id in ids]
+
+    # 帳戶與倉位
+    def open_position(self, symbol:str, side:str, size:float, entry_price:float | None = None):
+        # 直接建立倉位，供移動止盈機器人的壓力測試使用
+        entry_price = entry_price or self.price(symbol)
+        self.positions[symbol] = {'signed': size if side == 'long' else -size, 'avgPrice': entry_price}
+
+    async def fetch_positions(self, symbols:list[str] | None = None, params={}):
+        await self._request('fetch_positions')
+        positions = []
+        for symbol, position in self.positions.items():
+            if symbols and symbol not in symbols:
+                continue
+            size = abs(position['signed'])
+            positions.append({
+                'symbol': symbol, 'side': 'long' if position['signed'] > 0 else 'short',
+                'contracts': size, 'entryPrice': position['avgPrice'], 'markPrice': self.price(symbol),
+                'info': {'symbol': self.markets[symbol]['id'], 'size': str(size), 'avgPrice': str(position['avgPrice'])},
+            })
+        return positions
+
+    async def fetch_balance(self, params={}):
+        await self._request('fetch_balance')
+        return {'info': {'result': {'list': [{'coin': [{'coin': 'USDT', 'equity': str(self.balance)}]}]}}}
+
+    async def fetch_leverage(self, symbol:str, params={}):
+        await self._request('fetch_leverage')
+        return {'symbol': symbol, 'info': {'leverage': str(self.leverages[symbol])}}
+
+    async def set_leverage(self, leverage:int, symbol:str, params={}):
+        await self._request('set_leverage')
+        self.leverages[symbol] = int(leverage)
+        return {'info': {}}
+
+    async def close(self):
+        pass
@@ -0,0 +1,100 @@
+import logging
+import queue
+import threading
+import time
+
+import telebot
+
+logger = logging.getLogger('logger')
+
+MAX_MESSAGE_LENGTH = 4096   # Telegram 單則訊息長度上限
+
+class TelegramNotifier:
+    # 背景執行緒發送 Telegram 通知：呼叫端只做 put_nowait，佇列滿時直接丟棄
+    # 在 coalesce_window 秒內到達的訊息合併成一則發送，失敗時以指數退避重試
+    def __init__(self, key:str, chat_id, maxsize:int = 100, coalesce_window:float = 1.0, max_retries:int = 5, backoff:float = 1.0):
+        self.tb = telebot.TeleBot(key, parse_mode=None)    # API KEY 格式錯誤時拋出 ValueError
+        self.chat_id = chat_id
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def notify(self, msg:str) -> bool:
+        if self._closed:
+            return False
+        try:
+            self.queue.put_nowait(msg)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout:float = 5.0):
+        # 送出剩餘訊息後結束背景執行緒
+        self._closed = True
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _collect(self) -> tuple[list[str], bool]:
+        msg = self.queue.get()
+        if msg is None:
+            return [], True
+
+        batch = [msg]
+        deadline = time.monotonic() + self.coalesce_window
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                msg = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+            if msg is None:
+                return batch, True
+            batch.append(msg)
+
+    def _worker(self):
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                if self.dropped:
+                    batch.append(f"（通知佇列已滿，略過 {self.dropped} 則訊息）")
+                    self.dropped = 0
+                for text in split_message('\n\n'.join(batch)):
+                    self._send(text)
+            if stop:
+                return
+
+    def _send(self, text:str):
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.tb.send_message(self.chat_id, text)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"發送 Telegram 通知失敗：{e}")
+                    return
+                # 被限流時依照 Telegram 回傳的 retry_after 等待
+                retry_after = (getattr(e, 'result_json', None) or {}).get('parameters', {}).get('retry_after')
+                time.sleep(float(retry_after) if retry_after else delay)
+                delay *= 2
+
+def split_message(text:str, limit:int = MAX_MESSAGE_LENGTH) -> list[str]:
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        cut = cut if cut > 0 else limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    if text:
+        chunks.append(text)
+    return chunks
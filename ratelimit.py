@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+# Bybit V5 限流：每個 IP 每 5 秒 600 次請求，另外每個 UID 對各私有端點有獨立的每秒上限
+BYBIT_IP_RATE = 120
+BYBIT_IP_BURST = 600
+
+BYBIT_ENDPOINT_RATES = {
+    'order/create': 10,
+    'order/amend': 10,
+    'order/cancel': 10,
+    'order/cancel-all': 10,
+    'order/create-batch': 10,
+    'order/amend-batch': 10,
+    'order/cancel-batch': 10,
+    'order/realtime': 50,
+    'position/list': 50,
+    'position/set-leverage': 10,
+    'account/wallet-balance': 50,
+}
+
+# ccxt 方法對應的 Bybit 端點；未列出的公開端點只受 IP 限流
+METHOD_ENDPOINTS = {
+    'create_order': 'order/create',
+    'create_orders': 'order/create-batch',
+    'edit_order': 'order/amend',
+    'edit_orders': 'order/amend-batch',
+    'cancel_order': 'order/cancel',
+    'cancel_orders': 'order/cancel-batch',
+    'cancel_all_orders': 'order/cancel-all',
+    'fetch_open_orders': 'order/realtime',
+    'fetch_positions': 'position/list',
+    'fetch_leverage': 'position/list',
+    'set_leverage': 'position/set-leverage',
+    'fetch_balance': 'account/wallet-balance',
+}
+
+class TokenBucket:
+    def __init__(self, rate:float, capacity:float | None = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def headroom(self) -> float:
+        # 目前可用額度佔容量的比例（0~1），唯讀計算，可由其他執行緒呼叫
+        tokens = min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+        return tokens / self.capacity
+
+    async def acquire(self, cost:float = 1):
+        cost = min(float(cost), self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                await asyncio.sleep((cost - self.tokens) / self.rate)
+
+class RateLimiter:
+    # 所有請求共用 IP 令牌桶，私有端點再依 Bybit 各端點上限另外扣除（批次端點以訂單數計算權重）
+    def __init__(self, ip_rate:float = BYBIT_IP_RATE, ip_burst:float = BYBIT_IP_BURST, endpoint_rates:dict | None = None):
+        self.ip = TokenBucket(ip_rate, ip_burst)
+        self.endpoints = {
+            endpoint: TokenBucket(rate)
+            for endpoint, rate in (BYBIT_ENDPOINT_RATES if endpoint_rates is None else endpoint_rates).items()
+        }
+
+    def headroom(self) -> dict[tuple, float]:
+        # 供效能指標輸出：各令牌桶目前的剩餘額度比例
+        values = {(('bucket', 'ip'),): self.ip.headroom}
+        for endpoint, bucket in self.endpoints.items():
+            values[(('bucket', endpoint),)] = bucket.headroom
+        return values
+
+    async def acquire(self, method:str, weight:float = 1):
+        endpoint = METHOD_ENDPOINTS.get(method)
+        if endpoint in self.endpoints:
+            await self.endpoints[endpoint].acquire(weight)
+        await self.ip.acquire(1)
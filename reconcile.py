@@ -0,0 +1,51 @@
+import math
+from typing import NamedTuple
+
+BATCH_ORDER_LIMIT = 10  # Bybit 批次下單/撤單單次最多筆數
+
+class DesiredOrder(NamedTuple):
+    side: str
+    price: float
+    amount: float
+
+class OrderPlan(NamedTuple):
+    keep: list[dict]
+    amend: list[tuple[dict, DesiredOrder]]
+    cancel: list[dict]
+    create: list[DesiredOrder]
+
+def within_tolerance(current:float, target:float, tolerance_pct:float) -> bool:
+    # 容許值為 0 時仍忽略浮點誤差（例如 int(n) * min_amount 算出 38.400000000000006，交易所回報 38.4）
+    if math.isclose(current, target, rel_tol=1e-9, abs_tol=1e-12):
+        return True
+    if current == 0:
+        return False
+    return abs(target - current) / abs(current) * 100 <= tolerance_pct
+
+def reconcile_orders(desired:list[DesiredOrder], resting:list[dict], price_tolerance_pct:float = 0.0, amount_tolerance_pct:float = 0.0) -> OrderPlan:
+    # 比對期望掛單與目前掛單：價格與數量都在容許範圍內則保留，否則改單；多餘的掛單撤銷，缺少的新增
+    plan = OrderPlan([], [], [], [])
+    remaining = list(resting)
+
+    for order in desired:
+        candidates = [r for r in remaining if r.get('side') == order.side and r.get('price')]
+        if not candidates:
+            plan.create.append(order)
+            continue
+
+        match = min(candidates, key=lambda r: abs(float(r['price']) - order.price))
+        remaining.remove(match)
+
+        price_ok = within_tolerance(float(match['price']), order.price, price_tolerance_pct)
+        amount_ok = within_tolerance(float(match['amount']), order.amount, amount_tolerance_pct)
+        if price_ok and amount_ok:
+            plan.keep.append(match)
+        else:
+            plan.amend.append((match, order))
+
+    plan.cancel.extend(remaining)
+    return plan
+
+def chunked(items:list, size:int = BATCH_ORDER_LIMIT):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
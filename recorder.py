@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+from collections import Counter, defaultdict, deque
+import gzip
+import json
+import os
+import tempfile
+import time
+
+import ccxt
+from ccxt.base import errors
+
+# 交易所流量錄製與重播
+# 錄製：在 exchange/strategy/trailing 設定 "strategy_record_path" 或 "trail_record_path"（副檔名 .gz 時以 gzip 壓縮），
+#       每次請求以一行 JSON 附加寫入 {ts, method, args, kwargs, result | error, elapsed}
+# 重播：python recorder.py recording.jsonl --bot strategy
+#       以錄製的回應餵給機器人並盡快執行，量測扣除網路時間後的決策邏輯耗時
+
+def _open(path:str, mode:str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def request_key(method:str, args:tuple) -> str:
+    # 以方法名與第一個參數（交易對、訂單ID或交易對清單）區分同一方法的不同請求，併發時仍能對應到正確的回應
+    first = args[0] if args else None
+    return f'{method}:{json.dumps(first, separators=(",", ":"), default=str)}'
+
+class RecordingExchange:
+    # 包住 ccxt 客戶端，所有非同步方法的參數與回應附加寫入錄製檔；其他屬性直接轉給原客戶端
+    def __init__(self, exc, path:str):
+        self._exc = exc
+        self._path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = _open(path, 'a')
+
+    def __getattr__(self, name:str):
+        attr = getattr(self._exc, name)
+        if name.startswith('_') or not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def recorded(*args, **kwargs):
+            started = time.perf_counter()
+            entry = {'ts': self._exc.milliseconds(), 'method': name, 'args': args, 'kwargs': kwargs}
+            try:
+                result = await attr(*args, **kwargs)
+                entry['result'] = result
+                return result
+            except Exception as e:
+                entry['error'] = {'type': type(e).__name__, 'message': str(e)}
+                raise
+            finally:
+                entry['elapsed'] = round(time.perf_counter() - started, 6)
+                self._write(entry)
+        return recorded
+
+    def _write(self, entry:dict):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(entry, separators=(',', ':'), default=str) + '\n')
+        self._file.flush()
+
+    async def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        await self._exc.close()
+
+class ReplayExhausted(errors.ExchangeError):
+    pass
+
+class ReplayExchange:
+    # 依錄製檔回應請求的替身客戶端；同一 request_key 依錄製順序回傳，時鐘跟隨最後一筆回應的錄製時間
+    def __init__(self, path:str):
+        self.queues: dict[str, deque] = defaultdict(deque)
+        self.calls: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.clock = None
+        self.markets: dict[str, dict] = {}
+        self.markets_by_id: dict[str, list[dict]] = {}
+        self.exceptions = ccxt.bybit().exceptions
+
+        with _open(path, 'r') as F:
+            for line in F:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.queues[request_key(entry['method'], tuple(entry['args']))].append(entry)
+                    if self.clock is None:
+                        self.clock = entry['ts']
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def remaining(self, method:str) -> int:
+        return sum(len(queue) for key, queue in self.queues.items() if key.startswith(f'{method}:'))
+
+    def __getattr__(self, name:str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        async def replayed(*args, **kwargs):
+            self.calls[name] += 1
+            key = request_key(name, args)
+            queue = self.queues.get(key)
+            if not queue:
+                self.misses[name] += 1
+                raise ReplayExhausted(f'錄製檔中沒有 {key} 的回應')
+
+            entry = queue.popleft()
+            self.clock = entry['ts']
+            if 'error' in entry:
+                error = getattr(errors, entry['error']['type'], errors.ExchangeError)
+                raise error(entry['error']['message'])
+            if name == 'load_markets':
+                self.set_markets(entry['result'])
+            return entry['result']
+        return replayed
+
+    def milliseconds(self) -> int:
+        return int(self.clock or 0)
+
+    def set_markets(self, markets, currencies=None):
+        markets = markets.values() if isinstance(markets, dict) else markets
+        self.markets.update({market['symbol']: market for market in markets})
+        self.markets_by_id = {market['id']: [market] for market in self.markets.values()}
+        return self.markets
+
+    def market(self, symbol:str) -> dict:
+        return self.markets[symbol]
+
+    def safe_market(self, market_id:str, market=None, delimiter=None, market_type=None) -> dict:
+        markets = self.markets_by_id.get(market_id)
+        return markets[0] if markets else {'id': market_id, 'symbol': market_id}
+
+    async def close(self):
+        pass
+
+async def replay(path:str, bot_name:str, max_cycles:int | None = None) -> dict:
+    # 以重播客戶端建立機器人並連續執行到錄製檔用完；狀態快照寫入暫存目錄，不影響實際運行的狀態
+    from exchange_session import ExchangeSession
+    from ratelimit import RateLimiter
+
+    exchange = ReplayExchange(path)
+    session = ExchangeSession(exchange, RateLimiter(1e9, 1e9, {}))
+    state_dir = tempfile.mkdtemp(prefix='bybit-replay-')
+
+    # 機器人在建構時就會載入 STATE_FILE（移動止盈於 __init__ 還原倉位），因此先將模組常數指向暫存目錄，重播才不會讀到實際運行的狀態
+    if bot_name == 'strategy':
+        import strategy_bybit as module
+    else:
+        import trail_bybit as module
+    state_file = module.STATE_FILE
+    module.STATE_FILE = os.path.join(state_dir, 'state.json')
+    try:
+        bot = module.Bot(session)
+    finally:
+        module.STATE_FILE = state_file
+
+    if bot_name == 'strategy':
+        bot.semaphore = asyncio.Semaphore(bot.max_concurrency)
+        await bot._initialize()
+        cycle, marker = bot._run_cycle, 'fetch_tickers'
+    else:
+        cycle, marker = bot.monitor_position, 'fetch_positions'
+
+    cycles = 0
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    try:
+        while exchange.remaining(marker) and (max_cycles is None or cycles < max_cycles):
+            await cycle()
+            cycles += 1
+    finally:
+        if bot_name == 'strategy':
+            bot.markets.stop()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    return {
+        'cycles': cycles,
+        'seconds': elapsed,
+        'cycles_per_second': cycles / elapsed if elapsed > 0 else 0.0,
+        'cpu_ms_per_cycle': cpu / cycles * 1000 if cycles else 0.0,
+        'requests': sum(exchange.calls.values()),
+        'misses': dict(exchange.misses),
+        'unused': len(exchange),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='以錄製的交易所流量重播機器人，量測決策邏輯耗時')
+    parser.add_argument('recording', help='strategy_record_path / trail_record_path 錄製的檔案')
+    parser.add_argument('--bot', choices=['strategy', 'trail'], default='strategy')
+    parser.add_argument('--cycles', type=int, help='最多執行幾輪')
+    parser.add_argument('--verbose', action='store_true', help='保留機器人的 INFO 日誌輸出')
+    args = parser.parse_args()
+
+    # 機器人模組 import 時會設定 logger，之後再調高等級以免輸出干擾量測
+    import logging
+    import strategy_bybit, trail_bybit
+    if not args.verbose:
+        logging.getLogger('logger').setLevel(logging.WARNING)
+
+    result = asyncio.run(replay(args.recording, args.bot, args.cycles))
+    print(f"重播 {args.recording}（{args.bot}）")
+    print(f"輪數：{result['cycles']}，耗時：{result['seconds']:.3f} 秒（{result['cycles_per_second']:.1f} 輪/秒），每輪 CPU：{result['cpu_ms_per_cycle']:.3f} ms")
+    print(f"重播請求：{result['requests']}，找不到錄製回應：{result['misses'] or '無'}，未使用的錄製回應：{result['unused']}")
@@ -0,0 +1,51 @@
+import asyncio
+import datetime
+import logging
+
+import strategy_bybit
+import trail_bybit
+from exchange_session import ExchangeSession
+from strategy_bybit import config
+
+logger = logging.getLogger('logger')
+
+class Runtime:
+    # 在同一進程同時運行掛單策略與移動止盈：共用 ccxt 連線、限流器與市場資訊
+    # 策略端偵測到掛單成交時直接交給移動止盈端查詢該倉位，不必等下一次完整輪詢
+    def __init__(self, session:ExchangeSession | None = None):
+        self.session = session or ExchangeSession.bybit(config["api"]["bybit"], config["demo_trade"], record_path=config.get("strategy_record_path"))
+        self.strategy = strategy_bybit.Bot(self.session)
+        self.trail = trail_bybit.Bot(self.session)
+        if self.trail.exc is not None:
+            self.strategy.fill_listeners.append(self.trail.track)
+
+    async def _run(self):
+        tasks = [self.trail._run()]
+        if len(self.strategy.pairs) > 0 or self.strategy.scanner is not None:
+            tasks.append(self.strategy._run())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            await self.session.close()
+
+    def run(self):
+        if self.strategy.exc is None or self.trail.exc is None: return # Initialization failed.
+
+        starttime = datetime.datetime.now()
+        try:
+            asyncio.run(self._run())
+        except KeyboardInterrupt as e:
+            pass
+        finally:
+            if self.strategy.tb is not None:
+                self.strategy.tb.close()
+
+        execution_time = datetime.datetime.now() - starttime
+        days = execution_time.days
+        hours, remainder = divmod(execution_time.seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        logger.info(f'Runtime 已結束運行')
+        logger.info(f'運行時長：{days} 天 {hours} 小時 {minutes} 分鐘 {seconds} 秒')
+
+if __name__ == "__main__":
+    Runtime().run()
@@ -0,0 +1,47 @@
+import asyncio
+import math
+import time
+
+class DeadlineScheduler:
+    # 以截止時間排程取代「處理完再 sleep(interval)」：週期固定不隨處理時間漂移
+    # align=True 時截止時間對齊 interval 的整數倍（例如 60 秒即每根 1m K線收盤）再加上 offset
+    # 處理超時錯過的截止時間直接跳過，不會累積補跑，由 wait() 回傳跳過的次數
+    def __init__(self, interval:float, align:bool = False, offset:float = 0.0, clock=time.time):
+        self.interval = float(interval)
+        self.align = align
+        self.offset = float(offset)
+        self.clock = clock
+        self.deadline: float | None = None
+        self.missed = 0
+
+    def _first_deadline(self, now:float) -> float:
+        if not self.align:
+            return now
+        return math.ceil((now - self.offset) / self.interval) * self.interval + self.offset
+
+    def next_deadline(self, now:float, interval:float | None = None) -> tuple[float, int]:
+        interval = float(interval or self.interval)
+        if self.deadline is None:
+            return self._first_deadline(now), 0
+
+        deadline = self.deadline + interval
+        if now <= deadline:
+            return deadline, 0
+        missed = math.ceil((now - deadline) / interval)
+        return deadline + missed * interval, missed
+
+    async def wait(self, interval:float | None = None) -> int:
+        # interval 可逐次覆寫，供移動止盈依倉位狀態調整輪詢頻率
+        now = self.clock()
+        self.deadline, missed = self.next_deadline(now, interval)
+        self.missed += missed
+        delay = self.deadline - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return missed
+
+def stagger(index:int, count:int, spread:float) -> float:
+    # 將 count 個工作平均分散在 spread 秒內，避免請求集中在同一瞬間
+    if count <= 1 or spread <= 0:
+        return 0.0
+    return spread * index / count
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('logger')
+
+STATE_VERSION = 1
+
+class StateStore:
+    # 重啟用的狀態快照（JSON）：先寫入暫存檔並 fsync，再以 os.replace 原子替換，程式中斷時不會留下半份檔案
+    def __init__(self, path:str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> dict:
+        # 檔案不存在、版本不符或內容損毀時回傳空 dict，呼叫端照常冷啟動
+        try:
+            with open(self.path, 'r', encoding='utf-8') as F:
+                state = json.load(F)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f'讀取狀態快照 {self.path} 時發生錯誤：{e}，將重新初始化')
+            return {}
+
+        if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+            return {}
+        return state
+
+    @staticmethod
+    def age(state:dict) -> float:
+        # 快照距今秒數
+        return time.time() - float(state.get('saved_at', 0))
+
+    def save(self, state:dict):
+        state = {**state, 'version': STATE_VERSION, 'saved_at': time.time()}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp = f'{self.path}.tmp'
+        with self._lock:
+            with open(tmp, 'w', encoding='utf-8') as F:
+                json.dump(state, F, separators=(',', ':'))
+                F.flush()
+                os.fsync(F.fileno())
+            os.replace(tmp, self.path)
+
+    async def save_async(self, state:dict):
+        # 在事件迴圈中取得狀態，檔案寫入交給執行緒，避免阻塞其他協程
+        try:
+            await asyncio.to_thread(self.save, state)
+        except Exception as e:
+            logger.error(f'寫入狀態快照時發生錯誤：{e}')
+
+    async def run(self, collect, interval:float):
+        # 每 interval 秒呼叫 collect() 取得目前狀態並寫入
+        while True:
+            await asyncio.sleep(interval)
+            await self.save_async(collect())
@@ -1,19 +1,29 @@
+import asyncio
 import ccxt
 from ccxt.base.errors import *
-from collections import ChainMap
+from collections import ChainMap, defaultdict
 import datetime
 import json
-import os
-import pandas as pd
-from pandas import DataFrame
-import logging
+import numpy as np
 import time
+from typing import NamedTuple
+from exchange_session import ExchangeSession
+from indicators import TimeframeIndicators, target_prices
+from kline_buffer import KlineBuffer, MAX_FETCH_LIMIT
+from log_pipeline import DIVIDER, setup_logging
+from market_cache import MarketCache
+from metrics import Metrics
+from notifier import TelegramNotifier
+from reconcile import BATCH_ORDER_LIMIT, DesiredOrder, chunked, reconcile_orders
+from scheduler import DeadlineScheduler, stagger
+from state_store import StateStore
+from universe import UniverseScanner, kline_volatility
 
 # const
 VERSION = 1.1
 CONFIG_DIR = './configs'
 LOG_FILE = './logs/strategy_log.txt'
-DIVIDER = '=' * os.get_terminal_size().columns
+STATE_FILE = './state/strategy_state.json'
 SOURCE = 'close'
 
 config: ChainMap = ChainMap()
@@ -21,32 +31,22 @@ for filename in ['exchange', 'strategy', 'trailing']:
     with open(f"{CONFIG_DIR}/{filename}_config.json", 'r') as F:
         config = ChainMap(config, json.load(F))
 
-os.makedirs("logs", exist_ok=True)
+logger = setup_logging(LOG_FILE, config)
 
-logger = logging.getLogger('logger')
-logger.setLevel(logging.INFO)
-
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-
-file_handler = logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8")
-file_handler.setLevel(logging.DEBUG)
-
-formatter = logging.Formatter(
-    "[%(asctime)s][%(levelname)s] %(message)s", 
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-console_handler.setFormatter(formatter)
-file_handler.setFormatter(formatter)
-
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+# 每輪開始時一次取得的行情與掛單快照；任一欄為 None 表示取得失敗，各交易對改為個別查詢
+class Snapshot(NamedTuple):
+    tickers: dict[str, dict] | None
+    open_orders: dict[str, list[dict]] | None
 
 def round_price_to_tick(price, tick_size):
     tick_decimals = len(f"{tick_size:.10f}".rstrip('0').split('.')[1]) if '.' in f"{tick_size:.10f}" else 0
     adjusted_price = round(price / tick_size) * tick_size
     return f"{adjusted_price:.{tick_decimals}f}"
 
+def round_amount_to_step(amount, lot_step) -> float:
+    # 以 lot_step 的小數位數取整，去除 int(n) * min_amount 的浮點誤差，與交易所回報的數量一致
+    return float(round_price_to_tick(amount, lot_step))
+
 def convert_to_contrast_coin(price, amount_usdt, min_amount, commission=0.00055, leverage=10) -> float:
     amount = float(min_amount)
 
@@ -59,83 +59,288 @@ def convert_to_contrast_coin(price, amount_usdt, min_amount, commission=0.00055,
 
     return int((amount_usdt/cost)) * amount
 
-def ema(data, period:int):
-    df = pd.Series(data)
-    ema = df.ewm(span=period, adjust=False).mean()
-    return ema.iloc[-1]
-
-def calculate_atr(klines, period=60):
-    trs = []
-    for i in range(1, len(klines)):
-        high = float(klines[i][2])
-        low = float(klines[i][3])
-        prev_close = float(klines[i-1][4])
-        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
-        trs.append(tr)
-    atr = sum(trs[-period:]) / period
-    return atr
-
-def calculate_average_amplitude(klines, period=60):
-    amplitudes = []
-    for i in range(len(klines) - period, len(klines)):
-        high = float(klines[i][2])
-        low = float(klines[i][3])
-        close = float(klines[i][4])
-        amplitude = ((high - low) / close) * 100
-        amplitudes.append(amplitude)
-    average_amplitude = sum(amplitudes) / len(amplitudes)
-    return average_amplitude
-
 class Bot:
-    def __init__(self):
+    def __init__(self, session:ExchangeSession | None = None):
         print(f'Trade Bot 初始化中...')
         print(f'CCXT API 版本: {ccxt.__version__}')
 
         try:
-            self.exc = ccxt.bybit(config=config["api"]["bybit"])
-            if config["demo_trade"]:
-                self.exc.enable_demo_trading(True)
+            self.session = session or ExchangeSession.bybit(config["api"]["bybit"], config["demo_trade"], record_path=config.get("strategy_record_path"))
+            self.owns_session = session is None
+            self.exc = self.session.exc
+            self.markets = MarketCache(self.exc, float(config.get("market_cache_ttl", 3600)), float(config.get("market_reload_min_interval", 300)))
 
             self.pairs = [pair for pair in config["trading_pairs"]]
-            for pair in self.pairs:
-                l = self.exc.fetch_leverage(pair)
-                if not int(l["info"]["leverage"]) == int(config["leverage"]):
-                    self.exc.set_leverage(int(config["leverage"]), pair)
 
+            # 掃描模式：由全市場行情自動挑選交易對，trading_pairs 中的設定作為個別交易對的覆寫
+            universe = config.get("universe", {})
+            self.scanner = UniverseScanner.from_config(universe) if universe.get("enabled", False) else None
+            self.scan_interval = float(universe.get("scan_interval", 900))
+            self.pair_defaults = dict(universe.get("pair_defaults", {}))
+            self._scanned_at: float | None = None
+            if self.scanner is not None:
+                self.pairs = []
             self.interval = float(config["monitor_interval"])
+            self.max_concurrency = int(config.get("max_concurrency", 10))
+            self.pair_timeout = float(config.get("pair_timeout", self.interval))
+            # 每輪於K線收盤後 bar_close_offset 秒開始，交易對請求分散在 pair_spread 秒內送出
+            self.align_to_bar_close = bool(config.get("align_to_bar_close", True))
+            self.bar_close_offset = float(config.get("bar_close_offset", 2))
+            self.pair_spread = min(float(config.get("pair_spread", 0)), self.interval)
+            # 新掛訂單累積滿一批即送出，未滿一批時最多等待 batch_linger 秒併入其他交易對的訂單
+            self.batch_linger = float(config.get("batch_linger", 0.05))
+            self.klines: dict[str, KlineBuffer] = {}
+            self.indicators: dict[str, TimeframeIndicators] = {}
+
+            # 重啟時由快照還原K線、市場資訊與已套用的槓桿，省去逐一查詢與重新下載歷史K線
+            self.store = StateStore(STATE_FILE)
+            self.state_save_interval = float(config.get("state_save_interval", 30))
+            self.applied_leverage: dict[str, int] = {}
+
+            # 本機器人目前的掛單（交易對 → 訂單ID → 訂單）；掛單未經撤銷就從列表消失時視為成交，通知 fill_listeners
+            self.resting: dict[str, dict[str, dict]] = {}
+            self.fill_listeners: list = []
+
+            self.metrics = Metrics('strategy')
+            self.session = self.session.with_metrics(self.metrics)
+            self.cycle_seconds = self.metrics.histogram('cycle_seconds', '每輪處理所有交易對的耗時（秒）')
+            self.cycle_overruns = self.metrics.counter('cycle_overruns_total', '處理耗時超過 monitor_interval 的次數')
+            self.missed_ticks = self.metrics.counter('missed_ticks_total', '因處理逾時而跳過的排程週期數')
+            self.indicator_seconds = self.metrics.histogram('indicator_seconds', '單一交易對指標計算耗時（秒）', (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05))
+
+        except Exception as e:
+            logger.error(f'Trade Bot初始化失敗：{e}')
+            self.exc = None
+            return
+
+        self.tb = None
+        if config.get("telegram_notify", False):
+            try:
+                self.tb = TelegramNotifier(config["api"]["telegram"]["key"], config["api"]["telegram"]["chat_id"])
+            except ValueError as e:
+                logger.error(f"初始化 Telegram 機器人發生錯誤：檢查 'API KEY' 是否有誤")
+
+    async def _initialize(self) -> bool:
+        try:
+            if not self._restore_state(self.store.load()):
+                await self.markets.refresh()
+            self.markets.start()
+
+            if self.scanner is not None:
+                await self._scan()
+
+            await asyncio.gather(*(self._apply_leverage(pair) for pair in self.pairs))
 
             # account info
-            self.initial_capital = self.capital = self.usdt
-        
+            self.initial_capital = self.capital = await self._fetch_usdt()
+
         except NetworkError as e:
             logger.error('Trade Bot初始化失敗：請重新檢查網路連線狀況')
-            self.exc = None
-            return
+            return False
         except Exception as e:
             logger.error(f'Trade Bot初始化失敗：{e}')
-            self.exc = None
-            return
-        
+            return False
+
         self.starttime = datetime.datetime.now()
 
         logger.info(f'Trade Bot 版本-{VERSION} 開始運行')
         logger.info(f'帳戶初始資金：{self.capital:.3f} USDT')
-        
+        self.notify_telegram(f"🚀Trade Bot 開始運行\n\n交易對：{len(self.pairs)} 個\n帳戶初始資金：{self.capital:.3f} USDT")
+        return True
+
+    async def _apply_leverage(self, pair:str):
+        if self.applied_leverage.get(pair) == int(config["leverage"]):
+            return
+        l = await self.session.request('fetch_leverage', pair)
+        if not int(l["info"]["leverage"]) == int(config["leverage"]):
+            await self.session.request('set_leverage', int(config["leverage"]), pair)
+        self.applied_leverage[pair] = int(config["leverage"])
+
+    def _restore_state(self, state:dict) -> bool:
+        # 還原K線緩衝區與槓桿紀錄；回傳市場資訊是否也已由快照還原（快照涵蓋所有交易對且未逾時）
+        if not state:
+            return False
+
+        self.applied_leverage = {pair: int(leverage) for pair, leverage in state.get('leverage', {}).items()}
+        if self.scanner is not None:
+            self.scanner.active = list(state.get('pairs', []))
+            self.pairs = list(self.scanner.active)
+
+        for pair, kline_state in state.get('klines', {}).items():
+            if pair not in self.pairs:
+                continue
+            buffer = self.klines[pair] = KlineBuffer.from_state(kline_state)
+            engine = TimeframeIndicators(*self._indicator_key(self._pair_config(pair)), window=buffer.maxlen)
+            # 優先還原快照中的指標狀態；舊快照或設定已變更時，只有全為 1m 的指標能由緩衝區重建，較高週期留待第一輪暖機
+            if engine.restore(state.get('indicators', {}).get(pair)) or not engine.resamplers:
+                engine.extend(buffer.bars)  # 補上快照時緩衝區已合併、指標尚未計入的K線；已計入的會被略過
+                self.indicators[pair] = engine
+
+        markets = state.get('markets') or {}
+        age = self.store.age(state)
+        logger.info(f'已由狀態快照還原 {len(self.klines)} 個交易對的K線（快照時間：{age:.0f} 秒前）')
+        if age >= self.markets.ttl or not all(pair in markets for pair in self.pairs):
+            return False
+        if self.scanner is not None or not self.owns_session:
+            return False    # 掃描與共用連線的其他元件需要全市場的市場資訊，快照只保存已選交易對
+
+        self.exc.set_markets(list(markets.values()))
+        self.markets.restore(markets, age)
+        return True
+
+    def _collect_state(self) -> dict:
+        markets = self.exc.markets or {}
+        return {
+            'markets': {pair: markets[pair] for pair in self.pairs if pair in markets},
+            'leverage': dict(self.applied_leverage),
+            'klines': {pair: buffer.to_state() for pair, buffer in self.klines.items()},
+            'indicators': {pair: engine.to_state() for pair, engine in self.indicators.items()},
+            'pairs': list(self.pairs),
+        }
+
+    def _pair_config(self, pair:str) -> dict:
+        return config["trading_pairs"].get(pair) or self.pair_defaults
+
+    @staticmethod
+    def _indicator_key(pair_config:dict) -> tuple[int, str, str]:
+        # TimeframeIndicators 的建構參數；ema_timeframe / atr_timeframe 未設定時沿用 1m
+        return int(pair_config.get('ema', 240)), pair_config.get('ema_timeframe', '1m'), pair_config.get('atr_timeframe', '1m')
+
+    async def _seed_timeframes(self, pair:str, engine:TimeframeIndicators):
+        # 較高週期只在建立指標時抓取一次該週期的歷史K線暖機，之後都由 1m K線遞增合成，不再額外請求
+        now = self.exc.milliseconds()
+        timeframes = list(engine.resamplers)
+        results = await asyncio.gather(*(
+            self.session.request('fetch_ohlcv', pair, timeframe=timeframe, limit=min(engine.warmup(timeframe), MAX_FETCH_LIMIT))
+            for timeframe in timeframes
+        ))
+        for timeframe, ohlcv in zip(timeframes, results):
+            engine.seed(timeframe, ohlcv, now)
+
+    async def _scan(self):
+        # 以一次 fetch_tickers 取得全市場行情並更新交易對；新加入的設定槓桿，移除的撤銷掛單並釋放K線
+        try:
+            tickers = await self.session.request('fetch_tickers', None, params={"type": "swap", "subType": "linear"})
+        except Exception as e:
+            logger.error(f'掃描市場時發生錯誤：{e}')
+            return
+        self._scanned_at = time.monotonic()
+
+        markets = self.exc.markets or {}
+        volatility = await self._measure_volatility(self.scanner.shortlist(tickers, markets))
+        added, removed = self.scanner.update(tickers, markets, volatility)
+        if not added and not removed:
+            return
+        self.pairs = list(self.scanner.active)
+
+        results = await asyncio.gather(*(self._apply_leverage(pair) for pair in added), return_exceptions=True)
+        for pair, result in zip(added, results):
+            if isinstance(result, Exception):
+                logger.error(f"設定 {pair.split(':')[0]} 槓桿時發生錯誤：{result}")
+
+        await asyncio.gather(*(self._close_pair(pair) for pair in removed))
+
+        logger.info(f"交易對更新：加入 {', '.join(pair.split(':')[0] for pair in added) or '無'}；移除 {', '.join(pair.split(':')[0] for pair in removed) or '無'}")
+        self.notify_telegram(f"🔄交易對更新\n\n加入：{', '.join(pair.split(':')[0] for pair in added) or '無'}\n移除：{', '.join(pair.split(':')[0] for pair in removed) or '無'}\n目前共 {len(self.pairs)} 個")
+
+    async def _measure_volatility(self, pairs:list[str], limit:int = 61) -> dict[str, float]:
+        # 以 _process_pair 相同的 ATR 比率與平均振幅衡量初選交易對；已在處理中的交易對直接使用K線緩衝區，
+        # 其餘只抓取計算所需的最近 limit 根（Bybit 沒有多交易對的K線端點，仍需逐一請求），再以 kline_volatility 一次計算
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch(pair:str) -> list:
+            buffer = self.klines.get(pair)
+            if buffer is not None and len(buffer) >= limit:
+                return buffer.klines()[-limit:]
+            async with semaphore:
+                return await self.session.request('fetch_ohlcv', pair, timeframe='1m', limit=limit)
+
+        results = await asyncio.gather(*(fetch(pair) for pair in pairs), return_exceptions=True)
+        volatility, measured, klines = {}, [], []
+        for pair, result in zip(pairs, results):
+            if isinstance(result, Exception):
+                # 不列入 volatility：已選入的交易對由 scanner.update 保留到下次掃描
+                logger.debug(f"計算 {pair.split(':')[0]} 波動度時發生錯誤：{result}", extra={'pair': pair})
+            elif len(result) < limit:
+                volatility[pair] = float('nan')   # 新上市、K線不足 ATR/振幅週期的交易對不列入排名
+            else:
+                measured.append(pair)
+                klines.append([kline[:5] for kline in result[-limit:]])
+
+        if measured:
+            volatility.update(zip(measured, kline_volatility(np.asarray(klines, dtype=np.float64)).tolist()))
+        return volatility
+
+    async def _close_pair(self, pair:str):
+        self.klines.pop(pair, None)
+        self.indicators.pop(pair, None)
+        self.resting.pop(pair, None)
+        try:
+            orders = await self.session.request('fetch_open_orders', pair, params={"orderFilter": "Order"})
+            await self._cancel_orders(pair, orders)
+        except Exception as e:
+            logger.error(f'{e}')
+
     def run(self):
         if self.exc is None: return # Initialization failed.
 
-        if len(self.pairs) == 0: return
+        if len(self.pairs) == 0 and self.scanner is None: return
 
-        while True:
+        try:
+            asyncio.run(self._run())
+        except KeyboardInterrupt as e:
+            pass
+        finally:
+            if self.tb is not None:
+                self.tb.close()
+
+    async def _run(self):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        summary = None
+        saver = None
+        initialized = False
+
+        try:
+            if not await self._initialize(): return
+            initialized = True
+
+            if self.state_save_interval > 0:
+                saver = asyncio.create_task(self.store.run(self._collect_state, self.state_save_interval))
+
+            if int(config.get("strategy_metrics_port", 0)):
+                self.metrics.start_server(int(config["strategy_metrics_port"]))
+            if float(config.get("metrics_summary_interval", 0)):
+                summary = asyncio.create_task(self.metrics.log_summary(float(config["metrics_summary_interval"])))
+
+            scheduler = DeadlineScheduler(self.interval, self.align_to_bar_close, self.bar_close_offset)
             try:
-                for pair in self.pairs:
-                    self._process_pair(pair, config["trading_pairs"][pair])
-                time.sleep(self.interval)
-            except KeyboardInterrupt as e:
-                for pair in self.pairs:
-                    self._cancel_all_orders(pair=pair)
-                break
-        
+                while True:
+                    missed = await scheduler.wait()
+                    if missed:
+                        self.missed_ticks.inc(missed)
+                        logger.warning(f'上一輪處理逾時，跳過 {missed} 個排程週期')
+
+                    started = time.monotonic()
+                    await self._run_cycle()
+                    elapsed = time.monotonic() - started
+                    self.cycle_seconds.observe(elapsed)
+                    if elapsed > self.interval:
+                        self.cycle_overruns.inc()
+                        logger.warning(f'本輪處理耗時 {elapsed:.2f} 秒，超過監控間隔 {self.interval:.0f} 秒')
+            except asyncio.CancelledError as e:
+                await self._cancel_all_orders()
+        finally:
+            if summary is not None:
+                summary.cancel()
+            if saver is not None:
+                saver.cancel()
+            if initialized:
+                await self.store.save_async(self._collect_state())
+            self.metrics.stop_server()
+            self.markets.stop()
+            if self.owns_session:
+                await self.session.close()
+
         # Formatting datetime info
         execution_time = datetime.datetime.now()-self.starttime
         days = execution_time.days
@@ -147,128 +352,365 @@ class Bot:
         logger.info(f'Trade Bot 已結束運行')
         logger.info(f'運行時長：{days} 天 {hours} 小時 {minutes} 分鐘 {seconds} 秒')
         logger.info(f'帳戶總收益：{profit:.3f} USDT({profit/self.initial_capital*100:.1f}%)')
+        self.notify_telegram(f"Trade Bot 已結束運行\n\n運行時長：{days} 天 {hours} 小時 {minutes} 分鐘\n帳戶總收益：{profit:.3f} USDT")
 
-    def _process_pair(self, pair:str, pair_config:dict):
-        mark_price = self._get_current_price(pair)
+    async def _run_cycle(self):
+        if self.scanner is not None and (self._scanned_at is None or time.monotonic() - self._scanned_at >= self.scan_interval):
+            await self._scan()
+        pairs = list(self.pairs)
+        if not pairs:
+            return
 
-        klines = self._fetch_kline_data(pair)
-        if klines is None: return
+        snapshot = await self._fetch_snapshot()
+
+        # 各交易對同時計算目標並完成撤單與改單，單一交易對逾時或失敗不影響其他交易對
+        tasks = {
+            asyncio.create_task(self._process_pair_guarded(pair, self._pair_config(pair), snapshot, stagger(i, len(pairs), self.pair_spread))): pair
+            for i, pair in enumerate(pairs)
+        }
+        # 交易對完成後其新掛訂單立即併入待送批次：滿 BATCH_ORDER_LIMIT 筆即送出，未滿時最多等待 batch_linger 秒，
+        # 較慢的交易對不會延後其他交易對的下單
+        loop = asyncio.get_running_loop()
+        queued: list[tuple[str, DesiredOrder]] = []
+        placing: list[asyncio.Task] = []
+        deadline = None
+        remaining = set(tasks)
+        try:
+            while remaining:
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                done, remaining = await asyncio.wait(remaining, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    queued.extend((tasks[task], order) for order in task.result())
+
+                while len(queued) >= BATCH_ORDER_LIMIT:
+                    placing.append(asyncio.create_task(self._place_batch(queued[:BATCH_ORDER_LIMIT])))
+                    queued = queued[BATCH_ORDER_LIMIT:]
+                if not queued:
+                    deadline = None
+                elif deadline is None:
+                    deadline = loop.time() + self.batch_linger
+                if queued and (not remaining or loop.time() >= deadline):
+                    placing.append(asyncio.create_task(self._place_batch(queued)))
+                    queued, deadline = [], None
+        finally:
+            for task in remaining:
+                task.cancel()
+            if placing:
+                await asyncio.gather(*placing)
+
+    async def _fetch_snapshot(self) -> Snapshot:
+        # 所有交易對的報價與掛單各以一次請求取得，同一輪的交易對以同一時點的價格計算
+        tickers, orders = await asyncio.gather(
+            self.session.request('fetch_tickers', self.pairs),
+            self.session.request('fetch_open_orders', None, params={"settleCoin": "USDT", "orderFilter": "Order", "paginate": True}),
+            return_exceptions=True,
+        )
+
+        if isinstance(tickers, Exception):
+            logger.error(f'獲取行情快照時發生錯誤：{tickers}，改為逐一查詢價格')
+            tickers = None
+
+        open_orders = None
+        if isinstance(orders, Exception):
+            logger.error(f'獲取掛單快照時發生錯誤：{orders}，改為逐一查詢掛單')
+        else:
+            open_orders = defaultdict(list)
+            for order in orders:
+                open_orders[order['symbol']].append(order)
 
-        close_prices:list[float] = [float(kline[4]) for kline in klines]
+        return Snapshot(tickers, open_orders)
 
+    async def _process_pair_guarded(self, pair:str, pair_config:dict, snapshot:Snapshot, delay:float = 0.0) -> list[DesiredOrder]:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with self.semaphore:
+            try:
+                return await asyncio.wait_for(self._process_pair(pair, pair_config, snapshot), timeout=self.pair_timeout)
+            except asyncio.TimeoutError as e:
+                logger.error(f"處理交易對 {pair.split(':')[0]} 逾時，略過本輪")
+            except Exception as e:
+                logger.error(f"處理交易對 {pair.split(':')[0]} 時發生錯誤：{e}")
+        return []
+
+    async def _process_pair(self, pair:str, pair_config:dict, snapshot:Snapshot) -> list[DesiredOrder]:
+        # 回傳此交易對需要新掛的訂單，交由 _run_cycle 併入批次送出
         ema_value = int(pair_config.get('ema', 240))
-        if ema_value == 0:
-            is_bullish_trend = is_bearish_trend = True
+
+        ticker = (snapshot.tickers or {}).get(pair)
+        if ticker is not None and ticker.get('ask') is not None:
+            mark_price = float(ticker['ask'])
+            fetched = await self._fetch_kline_data(pair)
         else:
-            ema_trend = ema(close_prices, ema_value)
-            # logger.info(f"{pair.split(':')[0]} EMA{ema_value}：{ema_trend:.6f} 現價：{mark_price:.6f}")
-            is_bullish_trend = close_prices[-1] > ema_trend
-            is_bearish_trend = close_prices[-1] < ema_trend
+            mark_price, fetched = await asyncio.gather(
+                self._get_current_price(pair),
+                self._fetch_kline_data(pair),
+            )
+        if fetched is None: return []
+        buffer, new_klines = fetched
 
-        atr = calculate_atr(klines)
-        price_atr_ratio = (atr / mark_price) * 100
+        engine = self.indicators.get(pair)
+        key = self._indicator_key(pair_config)
+        if engine is None or engine.key != key:
+            # 新建的指標需要完整歷史：剛重新抓取時 new_klines 已涵蓋（且可能長於）緩衝區，否則以緩衝區重建
+            if not new_klines or (buffer.bars and new_klines[0][0] > buffer.bars[0][0]):
+                new_klines = list(buffer.bars)
+            engine = TimeframeIndicators(*key, window=buffer.maxlen)
+            if engine.resamplers:
+                await self._seed_timeframes(pair, engine)
+            self.indicators[pair] = engine
 
-        average_amplitude = calculate_average_amplitude(klines)
-        # logger.info(f"{pair.split(':')[0]} ATR：{atr} ATR ratio：{price_atr_ratio:.3f} % 平均振幅：{average_amplitude:.2f} %")
+        with self.metrics.timer(self.indicator_seconds):
+            engine.extend(new_klines)
 
-        value_multiplier = float(pair_config.get('value_multiplier', 2))
-        selected_value = (average_amplitude + price_atr_ratio)/2 * value_multiplier
+            ema_trend, atr, average_amplitude, last_close = engine.values(buffer.forming)
 
-        long_price_factor = 1 - selected_value / 100
-        short_price_factor = 1 + selected_value / 100
+        if ema_value == 0:
+            is_bullish_trend = is_bearish_trend = True
+        else:
+            logger.debug(f"{pair.split(':')[0]} EMA{ema_value}：{ema_trend:.6f} 現價：{mark_price:.6f}", extra={'pair': pair})
+            is_bullish_trend = last_close > ema_trend
+            is_bearish_trend = last_close < ema_trend
+
+        logger.debug(f"{pair.split(':')[0]} ATR：{atr} ATR ratio：{(atr / mark_price) * 100:.3f} % 平均振幅：{average_amplitude:.2f} %", extra={'pair': pair})
 
-        target_price_long = mark_price * long_price_factor
-        target_price_short = mark_price * short_price_factor
+        value_multiplier = float(pair_config.get('value_multiplier', 2))
+        target_price_long, target_price_short = target_prices(mark_price, atr, average_amplitude, value_multiplier)
 
         long_amount_usdt = float(pair_config.get('long_amount_usdt', 20))
         short_amount_usdt = float(pair_config.get('short_amount_usdt', 20))
 
-        self._cancel_all_orders(pair=pair)
-
-        print(DIVIDER)
-
+        desired = []
         if is_bullish_trend:
-            logger.info(f"交易對 {pair.split(':')[0]} 確認為多頭趨勢，將掛入多單")
-            self._place_order(pair, target_price_long, long_amount_usdt, 'buy')
+            logger.debug(f"交易對 {pair.split(':')[0]} 確認為多頭趨勢，將掛入多單", extra={'pair': pair})
+            desired.append(await self._build_order(pair, target_price_long, long_amount_usdt, 'buy'))
 
         if is_bearish_trend:
-            logger.info(f"交易對 {pair.split(':')[0]} 確認為空頭趨勢，將掛入空單")
-            self._place_order(pair, target_price_short, short_amount_usdt, 'sell')
+            logger.debug(f"交易對 {pair.split(':')[0]} 確認為空頭趨勢，將掛入空單", extra={'pair': pair})
+            desired.append(await self._build_order(pair, target_price_short, short_amount_usdt, 'sell'))
 
-        
-    def _get_current_price(self, pair:str) -> float:
+        resting = None if snapshot.open_orders is None else snapshot.open_orders.get(pair, [])
+        return await self._sync_orders(pair, [order for order in desired if order is not None], pair_config, resting)
+
+    async def _get_current_price(self, pair:str, retry:bool=True) -> float:
         price = -1.0
         try:
-            price = float(self.exc.fetch_ticker(pair)["ask"])
+            price = float((await self.session.request('fetch_ticker', pair))["ask"])
             return price
+        except RequestTimeout as e:
+            if not retry:
+                logger.error('獲取價格數據時網路連線逾時')
+                return price
+            logger.error('獲取價格數據時網路連線逾時：將重新嘗試')
+            return await self._get_current_price(pair, retry=False)
         except NetworkError as e:
             logger.error('獲取價格數據時發生網路異常：請重新檢查網路連線狀況')
             return price
-        except RequestTimeout as e:
-            logger.error('獲取價格數據時網路連線逾時：將重新嘗試')
-            return self._get_current_price()
         except Exception as e:
             logger.error(f'獲取價格數據時發生未知錯誤：{e}')
             return price
 
-    def _fetch_kline_data(self, pair:str, bar='1m', limit=241) -> list[list]:
+    async def _fetch_kline_data(self, pair:str, bar='1m', limit=241) -> tuple[KlineBuffer, list[list]] | None:
+        # 回傳 (K線緩衝區, 本次新收盤的K線)
         try:
-            df = self.exc.fetch_ohlcv(pair, timeframe=bar, limit=limit)
-            return df
+            buffer = self.klines.get(pair)
+            if buffer is None or buffer.timeframe != bar or buffer.maxlen != limit:
+                buffer = self.klines[pair] = KlineBuffer(bar, limit)
+
+            now = self.exc.milliseconds()
+            fetch_limit = buffer.fetch_limit(now)
+            if fetch_limit is None:
+                # 首次抓取或中斷過久：重新下載完整歷史
+                seed_limit = min(limit, MAX_FETCH_LIMIT)
+                ohlcv = await self.session.request('fetch_ohlcv', pair, timeframe=bar, limit=seed_limit)
+                new_klines = buffer.seed(ohlcv, now)
+                self.indicators.pop(pair, None)
+            else:
+                # 只抓取上次收盤之後的K線
+                ohlcv = await self.session.request('fetch_ohlcv', pair, timeframe=bar, since=buffer.since(), limit=fetch_limit)
+                new_klines = buffer.merge(ohlcv, now)
+            return buffer, new_klines
         except NetworkError as e:
             logger.error('獲取歷史數據時發生網路異常：請重新檢查網路連線狀況')
         except Exception as e:
             logger.error(f'獲取歷史數據時發生錯誤：{e}')
         return None
-    
-    def _place_order(self, pair:str, price, amount_usdt, side):
+
+    async def _build_order(self, pair:str, price, amount_usdt, side) -> DesiredOrder | None:
+        try:
+            market = await self.markets.get(pair)
+        except Exception as e:
+            logger.error(f"讀取市場資訊時發生錯誤：{e}")
+            return None
+
+        price = float(round_price_to_tick(price, market.tick_size))
+        leverage = int(config["leverage"])
+        amount = round_amount_to_step(convert_to_contrast_coin(price, amount_usdt, market.min_amount, 0.0002, leverage), market.lot_step)
+
+        if amount == 0:
+            logger.info(f"{pair.split(':')[0]} 下單保證金低於最低名義價值：請增加單次下單保證金。")
+            return None
+        return DesiredOrder(side, price, amount)
+
+    async def _sync_orders(self, pair:str, desired:list[DesiredOrder], pair_config:dict, resting:list[dict] | None = None) -> list[DesiredOrder]:
+        # 價格與數量差異在容許範圍內的掛單保持不動以保留排隊順位，其餘改單；不再需要的掛單批次撤銷
+        # 回傳需要新掛的訂單（含改單時原掛單已不存在者）；resting 為 None 時才個別查詢掛單
+        if resting is None:
+            try:
+                resting = await self.session.request('fetch_open_orders', pair, params={"orderFilter": "Order"})
+            except Exception as e:
+                logger.error(f'獲取掛單資訊時發生錯誤：{e}')
+                return []
+
+        ids = {order['id'] for order in resting}
+        gone = [order for id, order in self.resting.get(pair, {}).items() if id not in ids]
+        if gone:
+            self._on_fill(pair, gone)
+
+        plan = reconcile_orders(
+            desired,
+            resting,
+            float(pair_config.get('order_price_tolerance_pct', config.get("order_price_tolerance_pct", 0.05))),
+            float(pair_config.get('order_amount_tolerance_pct', config.get("order_amount_tolerance_pct", 0))),
+        )
+
+        for order in plan.keep:
+            logger.debug(f"掛單 {order['id']} 價格與數量仍在容許範圍內，保持不變", extra={'pair': pair})
+
+        self.resting[pair] = {order['id']: order for order in plan.keep + [order for order, _ in plan.amend]}
+        await self._cancel_orders(pair, plan.cancel)
+        amended = await asyncio.gather(*(self._amend_order(pair, order, target) for order, target in plan.amend))
+        return plan.create + [order for order in amended if order is not None]
+
+    def _on_fill(self, pair:str, orders:list[dict]):
+        for order in orders:
+            self.resting.get(pair, {}).pop(order['id'], None)
+        logger.info(f"{pair.split(':')[0]} 掛單 {', '.join(order['id'] for order in orders)} 已不在掛單列表，視為已成交", extra={'pair': pair, 'event': 'fill'})
+        for listener in self.fill_listeners:
+            listener(pair)
+
+    def _track_order(self, pair:str, order_id:str, order:DesiredOrder):
+        self.resting.setdefault(pair, {})[order_id] = {'id': order_id, 'side': order.side, 'price': order.price, 'amount': order.amount}
+
+    async def _place_batch(self, orders:list[tuple[str, DesiredOrder]]):
+        # Bybit 批次下單依送出順序回傳每筆結果，逐筆對應回交易對與方向；整批失敗時改為逐筆提交
+        if len(orders) == 1:
+            await self._place_order(*orders[0])
+            return
+
         try:
-            market = self.exc.load_markets(True)
-            min_amount = float(market[pair]['limits']['amount']['min'])
-            leverage = int(config["leverage"])
-            amount = convert_to_contrast_coin(price, amount_usdt, min_amount, 0.0002, leverage)
+            results = await self.session.request(
+                'create_orders',
+                [
+                    {"symbol": pair, "type": 'limit', "side": order.side, "amount": order.amount, "price": order.price}
+                    for pair, order in orders
+                ],
+                weight=len(orders),
+            )
+        except Exception as e:
+            logger.error(f"批次下單時發生錯誤：{e}，改為逐筆提交")
+            await asyncio.gather(*(self._place_order(pair, order) for pair, order in orders))
+            return
 
-            if amount == 0:
-                logger.info(f"下單保證金低於最低名義價值：請增加單次下單保證金。")
-                return
+        leverage = int(config['leverage'])
+        for (pair, order), result in zip(orders, results):
+            if result.get('id'):
+                logger.info(f"成功掛入 {pair.split(':')[0]} 訂單，方向：{order.side}，價格：{order.price:.6f}，手數：{order.amount:.8f}，槓桿：{leverage}x，訂單ID：{result['id']}", extra={'pair': pair, 'side': order.side, 'order_id': result['id'], 'event': 'create'})
+                self._track_order(pair, result['id'], order)
+                continue
 
-            logger.info(f"掛單價格：{price:.6f}")
-            logger.info(f"掛單手數：{amount:.8f}")
-            logger.info(f"槓桿：{leverage}x")
+            info = result.get('info') or {}
+            error = getattr(self.exc, 'exceptions', {}).get('exact', {}).get(str(info.get('code')), ExchangeError)
+            self._handle_order_error(pair, error(f"{pair.split(':')[0]} {order.side} {info.get('msg', info)}"))
 
-            order = self.exc.create_order(
+    async def _place_order(self, pair:str, order:DesiredOrder):
+        try:
+            logger.debug(f"掛單價格：{order.price:.6f}，掛單手數：{order.amount:.8f}，槓桿：{int(config['leverage'])}x", extra={'pair': pair})
+
+            created = await self.session.request(
+                'create_order',
                 symbol=pair, 
                 type='limit', 
-                side=side, 
-                amount=amount, 
-                price=price
+                side=order.side, 
+                amount=order.amount, 
+                price=order.price
             )
 
-            logger.info(f"成功掛入訂單，訂單ID：{order['id']}")
+            logger.info(f"成功掛入 {pair.split(':')[0]} 訂單，方向：{order.side}，價格：{order.price:.6f}，手數：{order.amount:.8f}，訂單ID：{created['id']}", extra={'pair': pair, 'side': order.side, 'order_id': created['id'], 'event': 'create'})
+            self._track_order(pair, created['id'], order)
 
-        except InsufficientFunds as e:
+        except Exception as e:
+            self._handle_order_error(pair, e)
+
+    def _handle_order_error(self, pair:str, e:Exception):
+        if isinstance(e, InsufficientFunds):
             logger.error(f"保證金不足，無法提交訂單")
+            self.notify_telegram(f"⚠️{pair.split(':')[0]} 保證金不足，無法提交訂單")
+
+        elif isinstance(e, InvalidOrder):
+            # 精度或數量限制可能已變更，下次下單時重新載入該交易對的市場資訊
+            self.markets.invalidate(pair)
+            logger.error(f"提交訂單時發生錯誤：{e}")
 
-        except BadRequest as e:
+        elif isinstance(e, BadRequest):
             logger.error(f"提交訂單時發生錯誤：{e}")
 
+        else:
+            logger.error(f"提交訂單時發生錯誤：{type(e).__name__} {e}")
+
+    async def _amend_order(self, pair:str, resting:dict, order:DesiredOrder) -> DesiredOrder | None:
+        # 回傳需要改為新掛的訂單
+        try:
+            await self.session.request(
+                'edit_order',
+                resting["id"],
+                pair,
+                'limit',
+                order.side,
+                amount=order.amount,
+                price=order.price
+            )
+            logger.info(f"已調整訂單 {resting['id']}：價格 {float(resting['price']):.6f} → {order.price:.6f}，手數 {float(resting['amount']):.8f} → {order.amount:.8f}", extra={'pair': pair, 'side': order.side, 'order_id': resting['id'], 'event': 'amend'})
+
+        except OrderNotFound as e:
+            # 掛單已成交或已被撤銷，改為新掛一張
+            self._on_fill(pair, [resting])
+            return order
+
+        except InvalidOrder as e:
+            self.markets.invalidate(pair)
+            logger.error(f"調整訂單時發生錯誤：{e}")
+
         except Exception as e:
-            logger.error(f"提交訂單時發生錯誤：{type(e)}")
-            print(e)
+            logger.error(f"調整訂單時發生錯誤：{e}")
 
-    def _cancel_all_orders(self,/,pair:str):
+    async def _cancel_orders(self, pair:str, orders:list[dict]):
         try:
-            orders = self.exc.fetch_open_orders(pair, params={"orderFilter": "Order"})
-            for order in orders:
-                orderId = order["id"]
-                self.exc.cancel_order(orderId, pair)
+            for chunk in chunked([order["id"] for order in orders]):
+                await self.session.request('cancel_orders', chunk, pair, weight=len(chunk))
+        except Exception as e:
+            logger.error(f'{e}')
+
+    async def _cancel_all_orders(self):
+        # 以一次查詢取得所有掛單，只撤銷設定中交易對的掛單
+        try:
+            orders = await self.session.request('fetch_open_orders', None, params={"settleCoin": "USDT", "orderFilter": "Order", "paginate": True})
         except Exception as e:
             logger.error(f'{e}')
+            return
+
+        by_pair = defaultdict(list)
+        for order in orders:
+            if order['symbol'] in self.pairs:
+                by_pair[order['symbol']].append(order)
+        await asyncio.gather(*(self._cancel_orders(pair, pair_orders) for pair, pair_orders in by_pair.items()))
+
+    def notify_telegram(self, msg:str):
+        if self.tb is not None:
+            self.tb.notify(msg)
 
-    @property
-    def usdt(self) -> float:
+    async def _fetch_usdt(self) -> float:
         try:
-            balance = self.exc.fetch_balance()["info"]["result"]["list"][0]["coin"]
+            balance = (await self.session.request('fetch_balance'))["info"]["result"]["list"][0]["coin"]
         except NetworkError as e:
             return -1
         except RequestTimeout as e:
@@ -281,4 +723,4 @@ class Bot:
                 return float(coin["equity"])
 
 if __name__ == "__main__":
-    Bot().run()
\ No newline at end of file
+    Bot().run()
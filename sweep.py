@@ -0,0 +1,211 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import itertools
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest import CONFIG_DIR, compute_signals, load_config, load_ohlcv, run_backtest, trail_params
+
+STRATEGY_KEYS = ('value_multiplier', 'ema')
+TRAIL_KEYS = (
+    'stop_loss_pct',
+    'low_trail_enable_threshold', 'first_trail_enable_threshold', 'second_trail_enable_threshold',
+    'low_trail_stop_loss_pct', 'trail_stop_loss_pct', 'higher_trail_stop_loss_pct',
+)
+
+# ema 與實盤相同，只在最近 241 根 1m K線內計算（見 backtest.windowed_ema），因此預設只掃描不超過視窗長度的週期；
+# 更長的趨勢過濾需在實盤設定 ema_timeframe 由較高週期計算，回測目前只模擬 1m
+DEFAULT_GRID = {
+    'value_multiplier': [1, 1.5, 2, 2.5, 3, 4],
+    'ema': [0, 60, 120, 240],
+    'stop_loss_pct': [0.4, 0.6, 0.8, 1.0],
+    'low_trail_enable_threshold': [0.2, 0.3, 0.4],
+    'first_trail_enable_threshold': [0.6, 0.8, 1.0],
+    'second_trail_enable_threshold': [1.5, 2, 3],
+    'low_trail_stop_loss_pct': [0.1, 0.2],
+    'trail_stop_loss_pct': [0.25, 0.35, 0.5],
+    'higher_trail_stop_loss_pct': [0.15, 0.2, 0.3],
+}
+
+REPORT_KEYS = ('trades', 'win_rate', 'pnl', 'return_pct', 'max_drawdown_pct', 'fill_rate_pct', 'avg_holding_bars')
+SIGNAL_CACHE_SIZE = 8
+
+# 子行程內的共享記憶體視圖與訊號快取
+_arrays: dict[str, np.ndarray] = {}
+_handles: list[shared_memory.SharedMemory] = []
+_signals: OrderedDict = OrderedDict()
+
+def _attach(specs:dict[str, tuple[str, tuple]]):
+    for pair, (name, shape) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _handles.append(shm)
+        _arrays[pair] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+def _cached_signals(pair:str, pair_config:dict) -> dict:
+    key = (pair, pair_config['value_multiplier'], pair_config['ema'])
+    if key in _signals:
+        _signals.move_to_end(key)
+        return _signals[key]
+    signals = _signals[key] = compute_signals(_arrays[pair], pair_config)
+    if len(_signals) > SIGNAL_CACHE_SIZE:
+        _signals.popitem(last=False)
+    return signals
+
+def _evaluate(task:tuple) -> tuple:
+    pair, params, base_pair_config, leverage, capital = task
+    pair_config = {**base_pair_config, **{k: params[k] for k in STRATEGY_KEYS}}
+    trail = {k: float(params[k]) for k in TRAIL_KEYS}
+    report = run_backtest(_arrays[pair], pair_config, trail, leverage, initial_capital=capital, signals=_cached_signals(pair, pair_config))
+    return pair, params, {k: report[k] for k in REPORT_KEYS}
+
+def valid(params:dict) -> bool:
+    # 檔位門檻必須遞增，否則移動止盈檔位無意義
+    return params['low_trail_enable_threshold'] < params['first_trail_enable_threshold'] < params['second_trail_enable_threshold']
+
+def expand_grid(grid:dict, base:dict) -> list[dict]:
+    space = {k: grid.get(k, [base[k]]) for k in STRATEGY_KEYS + TRAIL_KEYS}
+    keys = list(space)
+    combos = (dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys)))
+    return [params for params in combos if valid(params)]
+
+def sample_grid(grid:dict, base:dict, samples:int, seed:int | None = None) -> list[dict]:
+    # 每個參數可為候選值清單或 {"min": x, "max": y} 連續區間
+    rng = random.Random(seed)
+    results = []
+    attempts = 0
+    while len(results) < samples and attempts < samples * 100:
+        attempts += 1
+        params = {}
+        for k in STRATEGY_KEYS + TRAIL_KEYS:
+            space = grid.get(k, [base[k]])
+            if isinstance(space, dict):
+                value = rng.uniform(space['min'], space['max'])
+                params[k] = int(round(value)) if k == 'ema' else round(value, 4)
+            else:
+                params[k] = rng.choice(space)
+        if valid(params):
+            results.append(params)
+    return results
+
+def score(report:dict, metric:str, min_trades:int) -> float:
+    if report['trades'] < min_trades:
+        return float('-inf')
+    if metric == 'calmar':
+        return report['return_pct'] / max(report['max_drawdown_pct'], 1e-9)
+    return report[metric]
+
+def share_arrays(data:dict[str, np.ndarray]) -> tuple[list[shared_memory.SharedMemory], dict]:
+    # 將每個交易對的 OHLCV 複製進共享記憶體一次，子行程只取得名稱與形狀，不必 pickle 整個陣列
+    handles, specs = [], {}
+    for pair, ohlcv in data.items():
+        shm = shared_memory.SharedMemory(create=True, size=ohlcv.nbytes)
+        np.ndarray(ohlcv.shape, dtype=np.float64, buffer=shm.buf)[:] = ohlcv
+        handles.append(shm)
+        specs[pair] = (shm.name, ohlcv.shape)
+    return handles, specs
+
+def run_sweep(data:dict[str, np.ndarray], candidates:list[dict], config, workers:int | None = None, metric:str = 'return_pct', min_trades:int = 10, capital:float = 1000.0) -> dict[str, list]:
+    handles, specs = share_arrays(data)
+    leverage = int(config["leverage"])
+    # 同組 ema/value_multiplier 排在一起，讓子行程的訊號快取命中
+    candidates = sorted(candidates, key=lambda p: (p['value_multiplier'], p['ema']))
+    tasks = [
+        (pair, params, dict(config["trading_pairs"].get(pair, {})), leverage, capital)
+        for pair in data for params in candidates
+    ]
+
+    results: dict[str, list] = {pair: [] for pair in data}
+    try:
+        workers = workers or len(os.sched_getaffinity(0))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(specs,)) as pool:
+            chunksize = max(1, len(tasks) // (workers * 16))
+            for pair, params, report in pool.map(_evaluate, tasks, chunksize=chunksize):
+                results[pair].append((score(report, metric, min_trades), params, report))
+    finally:
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+
+    for pair in results:
+        results[pair].sort(key=lambda r: r[0], reverse=True)
+    return results
+
+def write_results(results:dict[str, list], out_dir:str, config_dir:str = CONFIG_DIR):
+    # 以現有設定檔格式輸出：strategy_config.json 更新各交易對參數，移動止盈參數寫入 trailing_config.json 的 symbol_overrides
+    os.makedirs(out_dir, exist_ok=True)
+
+    with open(f"{config_dir}/strategy_config.json", 'r') as F:
+        strategy = json.load(F)
+    with open(f"{config_dir}/trailing_config.json", 'r') as F:
+        trailing = json.load(F)
+
+    with open(os.path.join(out_dir, 'results.csv'), 'w', newline='', encoding='utf-8') as F:
+        writer = csv.writer(F)
+        writer.writerow(['pair', 'score', *STRATEGY_KEYS, *TRAIL_KEYS, *REPORT_KEYS])
+        for pair, rows in results.items():
+            for s, params, report in rows:
+                writer.writerow([pair, s, *(params[k] for k in STRATEGY_KEYS + TRAIL_KEYS), *(report[k] for k in REPORT_KEYS)])
+
+    overrides = trailing.setdefault("symbol_overrides", {})
+    for pair, rows in results.items():
+        if not rows or rows[0][0] == float('-inf'):
+            continue
+        _, params, _ = rows[0]
+        pair_config = strategy["trading_pairs"].setdefault(pair, {})
+        pair_config.update({k: params[k] for k in STRATEGY_KEYS})
+        overrides[pair] = {k: params[k] for k in TRAIL_KEYS}
+
+    with open(os.path.join(out_dir, 'strategy_config.json'), 'w', encoding='utf-8') as F:
+        json.dump(strategy, F, indent=4)
+    with open(os.path.join(out_dir, 'trailing_config.json'), 'w', encoding='utf-8') as F:
+        json.dump(trailing, F, indent=4)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='多核心平行掃描策略與移動止盈參數')
+    parser.add_argument('data', nargs='+', help='PAIR=路徑，例如 MOODENG/USDT:USDT=./data/MOODENG.npy')
+    parser.add_argument('--grid', help='參數空間 JSON 檔；未指定則使用內建網格')
+    parser.add_argument('--samples', type=int, default=0, help='隨機抽樣組數；0 表示完整網格')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--metric', default='return_pct', choices=['return_pct', 'pnl', 'win_rate', 'calmar'])
+    parser.add_argument('--min-trades', type=int, default=10)
+    parser.add_argument('--capital', type=float, default=1000.0)
+    parser.add_argument('--top', type=int, default=5)
+    parser.add_argument('--config-dir', default=CONFIG_DIR)
+    parser.add_argument('--out', default='./sweep_results')
+    args = parser.parse_args()
+
+    config = load_config(args.config_dir)
+    base = {**trail_params(config), 'value_multiplier': 2, 'ema': 240}
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid, 'r') as F:
+            grid = json.load(F)
+
+    candidates = sample_grid(grid, base, args.samples, args.seed) if args.samples else expand_grid(grid, base)
+
+    data = {}
+    for item in args.data:
+        pair, path = item.split('=', 1)
+        data[pair] = load_ohlcv(path)
+
+    print(f"共 {len(candidates)} 組參數 × {len(data)} 個交易對")
+    started = time.perf_counter()
+    results = run_sweep(data, candidates, config, args.workers, args.metric, args.min_trades, args.capital)
+    print(f"耗時：{time.perf_counter() - started:.1f} 秒")
+
+    for pair, rows in results.items():
+        print(f"{pair.split(':')[0]} 前 {args.top} 名：")
+        for s, params, report in rows[:args.top]:
+            print(f"  分數 {s:.3f} 收益 {report['return_pct']:.2f}% 回撤 {report['max_drawdown_pct']:.2f}% 成交 {report['trades']} 參數 {params}")
+
+    write_results(results, args.out, args.config_dir)
+    print(f"最佳參數已寫入 {args.out}")
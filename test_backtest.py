@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from backtest import compute_signals, windowed_ema
+from mock_exchange import MockBybit, MINUTE
+
+WINDOW = 241
+
+def mock_ohlcv(n:int, seed:int = 0) -> np.ndarray:
+    mock = MockBybit(['A/USDT:USDT'], seed=seed, clock=1_700_000_000_000)
+    mock.advance(n * MINUTE)
+    return np.asarray(mock.bars['A/USDT:USDT'][:n], dtype=np.float64)
+
+def reference_ema(close:np.ndarray, t:int, period:int) -> float:
+    # 實盤 ema(): 對最近 241 根K線呼叫 ewm(span=period, adjust=False)
+    return pd.Series(close[max(t - WINDOW + 1, 0):t + 1]).ewm(span=period, adjust=False).mean().iloc[-1]
+
+def test_windowed_ema_matches_ewm_on_each_window():
+    close = mock_ohlcv(1500)[:, 4]
+    for period in (60, 240, 1440):
+        ema = windowed_ema(close, period, WINDOW)
+        expected = np.array([reference_ema(close, t, period) for t in range(len(close))])
+        np.testing.assert_allclose(ema, expected, rtol=1e-12)
+
+def test_trend_filter_matches_live_bar_for_bar():
+    ohlcv = mock_ohlcv(5000, seed=3)
+    close = ohlcv[:, 4]
+    signals = compute_signals(ohlcv, {'ema': 240})
+    warmup = WINDOW
+    expected = np.array([reference_ema(close, t, 240) for t in range(warmup, len(close))])
+    np.testing.assert_array_equal(signals['bullish'][warmup:], close[warmup:] > expected)
+    np.testing.assert_array_equal(signals['bearish'][warmup:], close[warmup:] < expected)
@@ -0,0 +1,53 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from indicators import TimeframeIndicators
+from kline_buffer import KlineBuffer
+from mock_exchange import MockBybit, MINUTE
+
+SYMBOL = 'A/USDT:USDT'
+WINDOW = 241
+
+# 原本每輪對最近 241 根K線重新計算的版本，作為增量指標的對照
+def reference_ema(klines:list[list], period:int) -> float:
+    return pd.Series([float(kline[4]) for kline in klines]).ewm(span=period, adjust=False).mean().iloc[-1]
+
+def reference_atr(klines:list[list], period:int = 60) -> float:
+    trs = []
+    for i in range(1, len(klines)):
+        high, low, prev_close = float(klines[i][2]), float(klines[i][3]), float(klines[i-1][4])
+        trs.append(max(high - low, abs(high - prev_close), abs(low - prev_close)))
+    return sum(trs[-period:]) / period
+
+def reference_amplitude(klines:list[list], period:int = 60) -> float:
+    amplitudes = [(float(kline[2]) - float(kline[3])) / float(kline[4]) * 100 for kline in klines[-period:]]
+    return sum(amplitudes) / len(amplitudes)
+
+def fetch(mock:MockBybit, since:int | None, limit:int) -> list[list]:
+    # 模擬交易所的最後一根K線尚未收盤，與實盤相同
+    return asyncio.run(mock.fetch_ohlcv(SYMBOL, since=since, limit=limit))
+
+@pytest.mark.parametrize('period', [60, 240, 1440])
+def test_engine_matches_full_recompute_each_cycle(period):
+    mock = MockBybit([SYMBOL], seed=period, clock=1_700_000_000_000)
+    mock.advance(WINDOW * MINUTE)
+
+    buffer = KlineBuffer('1m', WINDOW)
+    engine = TimeframeIndicators(period, window=WINDOW)
+    engine.extend(buffer.seed(fetch(mock, None, WINDOW), mock.milliseconds()))
+
+    for cycle in range(700):
+        # 偶爾延遲半根K線，涵蓋一次合併多根與時鐘未對齊的情況
+        mock.advance(MINUTE + (30_000 if cycle % 97 == 0 else 0))
+        now = mock.milliseconds()
+        engine.extend(buffer.merge(fetch(mock, buffer.since(), buffer.fetch_limit(now)), now))
+
+        ema, atr, amplitude, last_close = engine.values(buffer.forming)
+        klines = buffer.klines()
+        assert len(klines) == WINDOW
+        assert last_close == klines[-1][4]
+        assert ema == pytest.approx(reference_ema(klines, period), rel=1e-12)
+        assert atr == pytest.approx(reference_atr(klines), rel=1e-12)
+        assert amplitude == pytest.approx(reference_amplitude(klines), rel=1e-12)
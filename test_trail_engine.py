@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from trail_engine import EXIT_REASONS, NO_EXIT, TrailEngine
+
+DEFAULTS = {
+    'stop_loss_pct': 0.6,
+    'low_trail_stop_loss_pct': 0.2,
+    'trail_stop_loss_pct': 0.35,
+    'higher_trail_stop_loss_pct': 0.2,
+    'low_trail_enable_threshold': 0.3,
+    'first_trail_enable_threshold': 0.8,
+    'second_trail_enable_threshold': 2,
+}
+
+def reference(params:dict, side:str, entry:float, mark:float, highest_profit:float) -> tuple[float, float, int, str | None]:
+    # trail_bybit 原本逐一判斷的版本：回傳 (盈虧, 最高盈虧, 檔位, 平倉原因)
+    profit_pct = (mark - entry) / entry * 100 if side == 'long' else (entry - mark) / entry * 100
+    highest_profit = max(highest_profit, profit_pct)
+
+    if highest_profit >= params['second_trail_enable_threshold']:
+        tier = 2
+    elif highest_profit >= params['first_trail_enable_threshold']:
+        tier = 1
+    elif highest_profit >= params['low_trail_enable_threshold']:
+        tier = 0
+    else:
+        tier = -1
+
+    if tier == 0 and profit_pct <= params['low_trail_stop_loss_pct']:
+        return profit_pct, highest_profit, tier, 'low_trail'
+    if tier == 1 and profit_pct <= highest_profit * (1 - params['trail_stop_loss_pct']):
+        return profit_pct, highest_profit, tier, 'first_trail'
+    if tier == 2 and profit_pct <= highest_profit * (1 - params['higher_trail_stop_loss_pct']):
+        return profit_pct, highest_profit, tier, 'second_trail'
+    if profit_pct <= -params['stop_loss_pct']:
+        return profit_pct, highest_profit, tier, 'stop_loss'
+    return profit_pct, highest_profit, tier, None
+
+@pytest.mark.parametrize('seed', range(3))
+def test_evaluate_matches_scalar_rules_on_random_paths(seed):
+    rng = random.Random(seed)
+    pairs = [f'P{i:03d}/USDT:USDT' for i in range(100)]
+    # 部分交易對覆寫參數，確認逐列參數與預設值都正確套用
+    overrides = {
+        pair: {'stop_loss_pct': rng.uniform(0.3, 2), 'second_trail_enable_threshold': rng.uniform(1, 3)}
+        for pair in rng.sample(pairs, 20)
+    }
+    engine = TrailEngine(DEFAULTS, overrides, capacity=8)
+
+    positions = {}
+    for pair in pairs:
+        side, entry = rng.choice(['long', 'short']), rng.uniform(0.5, 2)
+        engine.upsert(pair, side, 10, entry)
+        positions[pair] = {'side': side, 'entry': entry, 'mark': entry, 'peak': 0.0}
+
+    checked, reasons = 0, set()
+    for _ in range(200):
+        for pair, position in positions.items():
+            position['mark'] *= 1 + rng.gauss(0, 0.002)
+            engine.set_mark(pair, position['mark'])
+
+        result = engine.evaluate()
+        assert sorted(result.pairs) == sorted(positions)
+        for i, pair in enumerate(result.pairs):
+            position = positions[pair]
+            profit, peak, tier, reason = reference({**DEFAULTS, **overrides.get(pair, {})}, position['side'], position['entry'], position['mark'], position['peak'])
+            position['peak'] = peak
+
+            assert result.profit[i] == pytest.approx(profit, rel=1e-12, abs=1e-12)
+            assert result.peak[i] == pytest.approx(peak, rel=1e-12, abs=1e-12)
+            assert result.tier[i] == tier
+            assert (None if result.reason[i] == NO_EXIT else EXIT_REASONS[result.reason[i]]) == reason
+            checked += 1
+            reasons.add(reason)
+
+            # 與機器人相同：平倉後移除倉位
+            if reason is not None:
+                engine.remove(pair)
+                del positions[pair]
+
+    assert checked > 1000
+    assert reasons == {None, *EXIT_REASONS}
+    assert len(engine) == len(positions)
@@ -1,20 +1,27 @@
+import asyncio
 import ccxt
 from ccxt.base.errors import *
 from collections import ChainMap
 import datetime
 import json
-import os
 import pandas as pd
 from pandas import DataFrame
-import logging
-import telebot
 import time
+import numpy as np
+from bybit_stream import BybitStream, DEMO_PRIVATE_URL, PRIVATE_URL, PUBLIC_URL
+from exchange_session import ExchangeSession
+from log_pipeline import DIVIDER, setup_logging
+from metrics import Metrics
+from notifier import TelegramNotifier
+from scheduler import DeadlineScheduler
+from state_store import StateStore
+from trail_engine import NO_EXIT, EXIT_REASONS, SIDES, TrailEngine
 
 # const
 VERSION = 1.1
 CONFIG_DIR = './configs'
 LOG_FILE = './logs/trail_log.txt'
-DIVIDER = '=' * os.get_terminal_size().columns
+STATE_FILE = './state/trail_state.json'
 SOURCE = 'close'
 
 config: ChainMap = ChainMap()
@@ -22,43 +29,19 @@ for filename in ['exchange', 'strategy', 'trailing']:
     with open(f"{CONFIG_DIR}/{filename}_config.json", 'r') as F:
         config = ChainMap(config, json.load(F))
 
-def create_logger():
-    os.makedirs("logs", exist_ok=True)
-
-    logger = logging.getLogger('logger')
-    logger.setLevel(logging.INFO)
-
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-
-    file_handler = logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8")
-    file_handler.setLevel(logging.DEBUG)
-
-    formatter = logging.Formatter(
-        "[%(asctime)s][%(levelname)s] %(message)s", 
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
-
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    return logger
-
-logger = create_logger()
+logger = setup_logging(LOG_FILE, config)
 
 class Bot:
-    def __init__(self):
+    def __init__(self, session:ExchangeSession | None = None):
         print(f'Trail Bot 初始化中...')
         print(f'CCXT API 版本: {ccxt.__version__}')
 
         try:
-            self.exc = ccxt.bybit(config=config["api"]["bybit"])
-            if config["demo_trade"]:
-                self.exc.enable_demo_trading(True)
+            self.session = session or ExchangeSession.bybit(config["api"]["bybit"], config["demo_trade"], record_path=config.get("trail_record_path"))
+            self.owns_session = session is None
+            self.exc = self.session.exc
 
-            self.tb = telebot.TeleBot(config["api"]["telegram"]["key"], parse_mode=None)
-            self.chatid = config["api"]["telegram"]["chat_id"]
+            self.tb = TelegramNotifier(config["api"]["telegram"]["key"], config["api"]["telegram"]["chat_id"])
         
         except NetworkError as e:
             logger.error('Trade Bot初始化失敗：請重新檢查網路連線狀況')
@@ -77,138 +60,287 @@ class Bot:
         self.starttime = datetime.datetime.now()
 
         self.leverage = int(config["leverage"])
-        self.stop_loss_pct = float(config["stop_loss_pct"])
-        self.low_trail_stop_loss_pct = float(config["low_trail_stop_loss_pct"])
-        self.trail_stop_loss_pct = float(config["trail_stop_loss_pct"])
-        self.higher_trail_stop_loss_pct = float(config["higher_trail_stop_loss_pct"])
-        self.low_trail_enable_threshold = float(config["low_trail_enable_threshold"])
-        self.first_trail_enable_threshold = float(config["first_trail_enable_threshold"])
-        self.second_trail_enable_threshold = float(config["second_trail_enable_threshold"])
         self.blacklist = set(config.get("blacklist", []))
         self.interval = float(config["monitor_interval"])
-
-        self.highest_profits = {}
-        self.current_tiers = {}
-        self.detected_positions = set()
+        # 盈虧距離止損價或下一檔門檻在 near_boundary_pct 個百分點內的倉位，改以 fast_monitor_interval 秒單獨輪詢
+        self.fast_monitor_interval = float(config.get("fast_monitor_interval", 0))
+        self.near_boundary_pct = float(config.get("near_boundary_pct", 0.1))
+
+        # 串流模式：以 WebSocket 推播的標記價格驅動止盈止損，斷線時退回 REST 輪詢
+        self.streaming = bool(config.get("streaming", False))
+        self.stream_retry_interval = float(config.get("stream_retry_interval", 30))
+        self.stream_public_url = config.get("stream_public_url", PUBLIC_URL)
+        self.stream_private_url = config.get("stream_private_url", DEMO_PRIVATE_URL if config["demo_trade"] else PRIVATE_URL)
+        self.stream_record_path = config.get("stream_record_path")
+
+        # 每個倉位在 TrailEngine 中佔一列；symbol_overrides 可針對個別交易對覆寫檔位參數
+        self.engine = TrailEngine(config, config.get("symbol_overrides", {}))
+        self.skipped: set[str] = set()
+        self.closing: set[str] = set()
+        self.pending: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+        # 重啟時還原最高盈虧與檔位，避免持倉中途重啟讓移動止盈退回初始檔位
+        self.store = StateStore(STATE_FILE)
+        self.state_save_interval = float(config.get("state_save_interval", 30))
+        self.engine.restore(self.store.load().get('positions', {}))
+        if len(self.engine):
+            logger.info(f"已由狀態快照還原 {len(self.engine)} 個倉位的最高盈虧與檔位")
+
+        self.metrics = Metrics('trail')
+        self.session = self.session.with_metrics(self.metrics)
+        self.cycle_seconds = self.metrics.histogram('cycle_seconds', '每輪 REST 倉位輪詢與評估的耗時（秒）')
+        self.cycle_overruns = self.metrics.counter('cycle_overruns_total', '輪詢耗時超過 monitor_interval 的次數')
+        self.stop_fill_seconds = self.metrics.histogram('stop_fill_seconds', '觸發止盈止損到平倉單回報的耗時（秒）')
+        self.stop_triggers = self.metrics.counter('stop_triggers_total', '觸發平倉的次數')
+        self.missed_ticks = self.metrics.counter('missed_ticks_total', '因處理逾時而跳過的排程週期數')
 
         logger.info(f'Trail Bot 版本 {VERSION} 開始運行')
 
-    def monitor_position(self):
-        positions = self._fetch_positions()
-
+    async def monitor_position(self, pairs:list[str] | None = None):
+        # pairs 為 None 時輪詢全部倉位；否則只更新指定交易對（Bybit 單次查詢僅接受一個交易對）
+        if pairs is None:
+            positions = await self._fetch_positions()
+            if positions is None:
+                return
+            fetched = None
+        else:
+            results = await asyncio.gather(*(self._fetch_positions([pair]) for pair in pairs))
+            positions = [position for result in results if result is not None for position in result]
+            fetched = [pair for pair, result in zip(pairs, results) if result is not None]
+
+        present = set()
         for position in positions:
-            pair:str = position['symbol']
-            position_amt = float(position['info']['size'])  # 使用 positionAmt 来获取仓位数量
-            entry_price = float(position['info']['avgPrice'])
-            current_price = float(position['markPrice'])
-            side:str = position['side']
+            info = position['info']
+            if self._update_position(position['symbol'], position['side'], info['size'], info['avgPrice'], position.get('markPrice')):
+                present.add(position['symbol'])
+
+        # 已不存在的倉位（停機期間或手動平倉）移除，之後同交易對的新倉位才會從初始檔位開始
+        for pair in (self.engine.pairs if fetched is None else fetched):
+            if pair not in present and pair not in self.closing:
+                self.engine.remove(pair)
+
+        await self._evaluate(None if pairs is None else list(present), verbose=pairs is None)
 
+    def _update_position(self, pair:str, side:str, size, entry_price, mark_price=None) -> bool:
+        # 寫入倉位資料，回傳此倉位是否需要監控
+        position_amt = float(size or 0)
+        if position_amt == 0 or side not in SIDES:
+            return False
+
+        symbol = pair.split(':')[0]
+        if pair in self.blacklist:
+            if not pair in self.skipped:
+                self.notify_telegram(f"檢測到封鎖名單：{symbol}，跳過監控")
+                self.skipped.add(pair)
+            return False
+
+        entry_price = float(entry_price)
+        if self.engine.upsert(pair, side, position_amt, entry_price, None if mark_price is None else float(mark_price)):
+            logger.info(f"首次檢測到倉位：{symbol}，數量：{position_amt}，入場價格：{entry_price}，方向：{side}")
+            self.notify_telegram(f"🛑首次檢測到倉位\n\n幣種：{symbol}\n數量：{position_amt}\n入場價格：{entry_price}\n方向：{side.upper()}\n\n已重置檔位與最高獲利紀錄並開始監控")
+        return True
+
+    def track(self, pair:str):
+        # 由策略端回報成交時呼叫：立即查詢該交易對的倉位並開始監控，不必等下一次完整輪詢
+        self._spawn(self.monitor_position([pair]))
+
+    def _near_boundary(self) -> list[str]:
+        return self.engine.near_boundary(self.near_boundary_pct)
+
+    async def _evaluate(self, pairs:list[str] | None = None, verbose:bool = False):
+        # 一次計算所有（或指定）倉位的盈虧與檔位，只輸出檔位變動與觸發平倉的倉位，觸發的倉位同時送出平倉單
+        result = self.engine.evaluate(pairs)
+        changed = False
+        closes = []
+
+        for i in np.flatnonzero((result.tier != result.previous_tier) | (result.reason != NO_EXIT)):
+            pair = result.pairs[i]
             symbol = pair.split(':')[0]
+            profit, peak, tier = result.profit[i], result.peak[i], int(result.tier[i])
 
-            if position_amt == 0:
-                continue
+            if tier != result.previous_tier[i]:
+                changed = True
+                logger.info(f"{symbol} 檔位變更：{int(result.previous_tier[i])} → {tier}，盈虧：{profit:.2f}%，最高盈虧：{peak:.2f}%，平倉價位：{result.level[i]:.2f}%", extra={'pair': pair, 'event': 'tier'})
 
-            if pair in self.blacklist:
-                if not pair in self.detected_positions:
-                    self.notify_telegram(f"檢測到封鎖名單：{symbol}，跳過監控")
-                    self.detected_positions.add(pair)
+            if result.reason[i] == NO_EXIT or pair in self.closing:
                 continue
 
-            if not pair in self.detected_positions:
-                self.detected_positions.add(pair)
-                self.highest_profits[pair] = 0
-                self.current_tiers[pair] = -1
-                logger.info(f"首次檢測到倉位：{symbol}，數量：{position_amt}，入場價格：{entry_price}，方向：{side}")
-                self.notify_telegram(f"🛑首次檢測到倉位\n\n幣種：{symbol}\n數量：{position_amt}\n入場價格：{entry_price}\n方向：{side.upper()}\n\n已重置檔位與最高獲利紀錄並開始監控")
-
-            if side == 'long':
-                profit_pct = (current_price - entry_price) / entry_price * 100
-            elif side == 'short':
-                profit_pct = (entry_price - current_price) / entry_price * 100
+            reason = EXIT_REASONS[result.reason[i]]
+            if reason == 'low_trail':
+                logger.info(f"{symbol} 觸發低檔保護止盈，盈虧回撤到：{profit:.2f}%，將平倉", extra={'pair': pair, 'event': reason})
+            elif reason == 'first_trail':
+                logger.info(f"{symbol} 價格達到獲利回徹閾值，目前檔位：第一檔移動止盈，最高盈虧：{peak:.2f}%，目前盈虧：{profit:.2f}%，平倉", extra={'pair': pair, 'event': reason})
+            elif reason == 'second_trail':
+                logger.info(f"{symbol} 價格達到獲利回徹閾值，目前檔位：第二檔移動止盈，最高盈虧：{peak:.2f}%，目前盈虧：{profit:.2f}%，平倉", extra={'pair': pair, 'event': reason})
             else:
-                continue
+                logger.info(f"{symbol} 觸發止損，當前盈虧：{profit:.2f}%，執行平倉", extra={'pair': pair, 'event': reason})
 
-            highest_profit = self.highest_profits.get(pair, 0)
-            if profit_pct > highest_profit:
-                highest_profit = profit_pct
-                self.highest_profits[pair] = highest_profit
-
-            current_tier = self.current_tiers.get(pair, -1)
-            if highest_profit >= self.second_trail_enable_threshold:
-                current_tier = 2
-            elif highest_profit >= self.first_trail_enable_threshold:
-                current_tier = 1
-            elif highest_profit >= self.low_trail_enable_threshold:
-                current_tier = 0
-            else:
-                current_tier = -1
-
-            self.current_tiers[pair] = current_tier
-
-            print(DIVIDER)
-            logger.info(f"監控 {symbol}，倉位大小：{position_amt}，方向：{side}，持倉價格：{entry_price}，標記價格：{current_price}，盈虧：{profit_pct:.2f}%，最高盈虧：{highest_profit:.2f}%，目前檔位：{current_tier}")
-
-            if current_tier == 0:
-                logger.info(f"價格回撤到 {self.low_trail_stop_loss_pct:.2f}% 離場")
-                if profit_pct <= self.low_trail_stop_loss_pct:
-                    logger.info(f"{symbol} 觸發低檔保護止盈，盈虧回撤到：{profit_pct:.2f}%，將平倉")
-                    self._close_position(pair, abs(position_amt), 'sell' if side == 'long' else 'buy')
-                    continue
-
-            elif current_tier == 1:
-                trail_stop_loss = highest_profit * (1 - self.trail_stop_loss_pct)
-                logger.info(f"價格回撤到 {trail_stop_loss:.2f}% 後止盈")
-                if profit_pct <= trail_stop_loss:
-                    logger.info(f"{symbol} 價格達到獲利回徹閾值，目前檔位：第一檔移動止盈，最高盈虧：{highest_profit:.2f}%，目前盈虧：{profit_pct:.2f}%，平倉")
-                    self._close_position(pair, abs(position_amt), 'sell' if side == 'long' else 'buy')
-                    continue
-
-            elif current_tier == 2:
-                trail_stop_loss = highest_profit * (1 - self.higher_trail_stop_loss_pct)
-                logger.info(f"價格回撤到 {trail_stop_loss:.2f}% 後止盈")
-                if profit_pct <= trail_stop_loss:
-                    logger.info(f"{symbol} 價格達到獲利回徹閾值，目前檔位：第二檔移動止盈，最高盈虧：{highest_profit:.2f}%，目前盈虧：{profit_pct:.2f}%，平倉")
-                    self._close_position(pair, abs(position_amt), 'sell' if side == 'long' else 'buy')
-                    continue
-
-            if profit_pct <= -self.stop_loss_pct:
-                logger.info(f"{symbol} 觸發止損，當前盈虧：{profit_pct:.2f}%，執行平倉")
-                self._close_position(pair, abs(position_amt), 'sell' if side == 'long' else 'buy')
-
-    def _close_position(self, pair:str, amount, side) -> bool:
+            position = self.engine.get(pair)
+            self.closing.add(pair)
+            closes.append((pair, position['size'], 'sell' if position['side'] == 'long' else 'buy'))
+
+        if verbose:
+            logger.debug(f"監控 {len(result.pairs)} 個倉位，接近止盈止損邊界：{len(self._near_boundary())} 個，本輪平倉：{len(closes)} 個")
+        if changed:
+            self._spawn(self.store.save_async(self._collect_state()))
+
+        await asyncio.gather(*(self._close_position(pair, amount, side) for pair, amount, side in closes))
+
+    async def _close_position(self, pair:str, amount, side) -> bool:
+        self.closing.add(pair)
+        self.stop_triggers.inc()
         try:
-            order = self.exc.create_order(pair, 'market', side, amount, None, {'type': 'future'})
-            logger.info(f"{pair.split(':')[0]} 的持倉已關閉")
+            with self.metrics.timer(self.stop_fill_seconds):
+                order = await self.session.request('create_order', pair, 'market', side, amount, None, {'type': 'future'})
+            logger.info(f"{pair.split(':')[0]} 的持倉已關閉", extra={'pair': pair, 'event': 'close'})
             self.notify_telegram(f"✅ {pair.split(':')[0]} 的持倉已關閉。")
-            self.detected_positions.discard(pair)
-            self.highest_profits.pop(pair, None)
-            self.current_tiers.pop(pair, None)
+            self.engine.remove(pair)
             return True
         except Exception as e:
             logger.error(f"關閉 {pair} 持倉時發生錯誤：{e}")
             return False
+        finally:
+            self.closing.discard(pair)
 
-    def _fetch_positions(self):
+    async def _fetch_positions(self, pairs:list[str] | None = None) -> list[dict] | None:
+        # 查詢失敗時回傳 None，與「目前沒有倉位」區分
         try:
-            positions = self.exc.fetch_positions()
+            positions = await self.session.request('fetch_positions', pairs)
             return positions
         except Exception as e:
             logger.error(f"獲取倉位資訊時發生錯誤：{e}")
-            return []
+            return None
+
+    def _collect_state(self) -> dict:
+        return {'positions': self.engine.to_state()}
     
     def notify_telegram(self, msg:str):
+        # 交由背景執行緒發送，不阻塞止盈止損流程
         if self.tb is not None:
-            self.tb.send_message(self.chatid, msg)
-            
+            self.tb.notify(msg)
+
+    def _on_stream_position(self, updates:list[dict]):
+        for update in updates:
+            market = self.exc.safe_market(update['symbol'], None, None, 'swap')
+            pair = market['symbol']
+            side = {'Buy': 'long', 'Sell': 'short'}.get(update.get('side'), '')
+
+            if not self._update_position(pair, side, update.get('size'), update.get('avgPrice') or update.get('entryPrice'), update.get('markPrice') or None):
+                if pair not in self.closing:
+                    self.engine.remove(pair)
+                continue
+
+            if not f"tickers.{market['id']}" in self.stream.subscribed:
+                self._spawn(self.stream.subscribe_tickers([market['id']]))
+
+    def _on_stream_ticker(self, ticker:dict):
+        mark_price = ticker.get('markPrice')
+        if not mark_price:
+            return  # delta 推播可能不含標記價格
+
+        pair = self.exc.safe_market(ticker['symbol'], None, None, 'swap')['symbol']
+        if not self.engine.set_mark(pair, float(mark_price)):
+            return
+
+        # 同一批抵達的推播累積後一次評估
+        self.pending.add(pair)
+        if len(self.pending) == 1:
+            self._spawn(self._evaluate_pending())
+
+    async def _evaluate_pending(self):
+        await asyncio.sleep(0)
+        pairs = list(self.pending)
+        self.pending.clear()
+        await self._evaluate(pairs)
+
+    def _spawn(self, coro):
+        # 保留任務參照，避免尚未完成的任務被回收
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_stream(self):
+        # 先以 REST 取得目前倉位作為初始狀態，之後由推播增量更新
+        await self.exc.load_markets()
+        await self.monitor_position()
+
+        self.stream = BybitStream(
+            config["api"]["bybit"]["apiKey"],
+            config["api"]["bybit"]["secret"],
+            self._on_stream_position,
+            self._on_stream_ticker,
+            self.stream_public_url,
+            self.stream_private_url,
+            self.stream_record_path,
+        )
+        await self.stream.subscribe_tickers([self.exc.market(pair)['id'] for pair in self.engine.pairs])
+        await self.stream.run()
+
+    async def _poll(self, duration:float | None = None):
+        # 每 interval 秒輪詢全部倉位；有倉位接近邊界時，其間另以較短週期只輪詢這些倉位
+        deadline = None if duration is None else time.monotonic() + duration
+        fast = 0 < self.fast_monitor_interval < self.interval
+        scheduler = DeadlineScheduler(self.interval)
+        last_full = None
+        while deadline is None or time.monotonic() < deadline:
+            near = self._near_boundary() if fast else []
+            missed = await scheduler.wait(self.fast_monitor_interval if near else self.interval)
+            if missed:
+                self.missed_ticks.inc(missed)
+
+            started = time.monotonic()
+            if not near or last_full is None or started - last_full >= self.interval - self.fast_monitor_interval / 2:
+                last_full = started
+                await self.monitor_position()
+            else:
+                await self.monitor_position(near)
+                continue
+
+            elapsed = time.monotonic() - started
+            self.cycle_seconds.observe(elapsed)
+            if elapsed > self.interval:
+                self.cycle_overruns.inc()
+
+    async def _run(self):
+        summary = None
+        saver = None
+        if self.state_save_interval > 0:
+            saver = asyncio.create_task(self.store.run(self._collect_state, self.state_save_interval))
+        if int(config.get("trail_metrics_port", 0)):
+            self.metrics.start_server(int(config["trail_metrics_port"]))
+        if float(config.get("metrics_summary_interval", 0)):
+            summary = asyncio.create_task(self.metrics.log_summary(float(config["metrics_summary_interval"])))
+
+        try:
+            if not self.streaming:
+                await self._poll()
+
+            while True:
+                try:
+                    await self._run_stream()
+                except Exception as e:
+                    logger.error(f"WebSocket 串流中斷：{e}，改用 REST 輪詢 {self.stream_retry_interval:.0f} 秒後重新連線")
+                await self._poll(self.stream_retry_interval)
+        finally:
+            if summary is not None:
+                summary.cancel()
+            if saver is not None:
+                saver.cancel()
+            await self.store.save_async(self._collect_state())
+            self.metrics.stop_server()
+            if self.owns_session:
+                await self.session.close()
+            if self.tb is not None:
+                self.tb.close()
+
     def run(self):
         if self.exc is None: return # Initialization failed.
 
-        while True:
-            try:
-                self.monitor_position()
-                time.sleep(self.interval)
-            except KeyboardInterrupt as e:
-                break
+        try:
+            asyncio.run(self._run())
+        except KeyboardInterrupt as e:
+            pass
         
         # Formatting datetime info
         execution_time = datetime.datetime.now() - self.starttime
@@ -221,4 +353,4 @@ class Bot:
         logger.info(f'運行時長：{days} 天 {hours} 小時 {minutes} 分鐘 {seconds} 秒')
 
 if __name__ == "__main__":
-    Bot().run()
\ No newline at end of file
+    Bot().run()
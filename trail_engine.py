@@ -0,0 +1,209 @@
+from typing import NamedTuple
+
+import numpy as np
+
+# 移動止盈參數，欄位順序即 params 陣列的欄位順序
+PARAM_KEYS = (
+    'stop_loss_pct', 'low_trail_stop_loss_pct', 'trail_stop_loss_pct', 'higher_trail_stop_loss_pct',
+    'low_trail_enable_threshold', 'first_trail_enable_threshold', 'second_trail_enable_threshold',
+)
+STOP_LOSS, LOW_STOP, TRAIL_STOP, HIGHER_STOP, LOW_ENABLE, FIRST_ENABLE, SECOND_ENABLE = range(len(PARAM_KEYS))
+
+NO_EXIT = -1
+EXIT_REASONS = ('stop_loss', 'low_trail', 'first_trail', 'second_trail')
+
+SIDES = {'long': 1, 'short': -1}
+
+class Evaluation(NamedTuple):
+    pairs: list[str]
+    profit: np.ndarray
+    peak: np.ndarray
+    tier: np.ndarray
+    previous_tier: np.ndarray
+    level: np.ndarray      # 目前檔位的平倉盈虧%（未啟用移動止盈時為 -stop_loss_pct）
+    reason: np.ndarray     # EXIT_REASONS 的索引，NO_EXIT 表示未觸發
+
+class TrailEngine:
+    # 以陣列保存所有倉位，每個倉位一列；盈虧、檔位與平倉條件一次向量計算
+    # 規則與 trail_bybit 原本逐一判斷的版本相同：最高盈虧決定檔位，檔位決定回撤平倉價，另有固定止損
+    # overrides 為 {交易對: {參數: 值}}，未指定的參數沿用 defaults
+    def __init__(self, defaults:dict, overrides:dict[str, dict] | None = None, capacity:int = 64):
+        self.defaults = np.array([float(defaults[key]) for key in PARAM_KEYS])
+        self.overrides = overrides or {}
+        self.index: dict[str, int] = {}
+        self.symbols: list[str] = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity:int):
+        old = getattr(self, 'entry', None)
+        n = len(self.symbols)
+        arrays = {
+            'side': np.zeros(capacity, dtype=np.int8),
+            'size': np.zeros(capacity),
+            'entry': np.zeros(capacity),
+            'mark': np.full(capacity, np.nan),
+            'peak': np.zeros(capacity),
+            'tier': np.full(capacity, -1, dtype=np.int8),
+            'distance': np.full(capacity, np.inf),
+            'verified': np.ones(capacity, dtype=bool),
+            'params': np.zeros((capacity, len(PARAM_KEYS))),
+        }
+        for name, array in arrays.items():
+            if old is not None:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, pair:str) -> bool:
+        return pair in self.index
+
+    @property
+    def pairs(self) -> list[str]:
+        return list(self.symbols)
+
+    def params_for(self, pair:str) -> np.ndarray:
+        params = self.defaults.copy()
+        for key, value in self.overrides.get(pair, {}).items():
+            if key in PARAM_KEYS:
+                params[PARAM_KEYS.index(key)] = float(value)
+        return params
+
+    def _insert(self, pair:str) -> int:
+        row = len(self.symbols)
+        if row == len(self.entry):
+            self._allocate(len(self.entry) * 2)
+        self.index[pair] = row
+        self.symbols.append(pair)
+        self.params[row] = self.params_for(pair)
+        self._reset(row)
+        return row
+
+    def _reset(self, row:int):
+        self.peak[row] = 0.0
+        self.tier[row] = -1
+        self.distance[row] = np.inf
+        self.verified[row] = True
+
+    def upsert(self, pair:str, side:str, size:float, entry:float, mark:float | None = None) -> bool:
+        # 新增或更新倉位，回傳是否為新倉位（首次出現，或方向改變、還原的紀錄與實際倉位不符）
+        new = False
+        row = self.index.get(pair)
+        if row is None:
+            row = self._insert(pair)
+            new = True
+        elif self.side[row] != SIDES[side] or (not self.verified[row] and self.entry[row] != entry):
+            self._reset(row)
+            new = True
+
+        self.side[row] = SIDES[side]
+        self.size[row] = size
+        self.entry[row] = entry
+        self.verified[row] = True
+        if mark is not None:
+            self.mark[row] = mark
+        return new
+
+    def set_mark(self, pair:str, mark:float) -> bool:
+        row = self.index.get(pair)
+        if row is None:
+            return False
+        self.mark[row] = mark
+        return True
+
+    def remove(self, pair:str):
+        # 以最後一列補位，保持陣列前段連續
+        row = self.index.pop(pair, None)
+        if row is None:
+            return
+        last = len(self.symbols) - 1
+        if row != last:
+            moved = self.symbols[last]
+            for name in ('side', 'size', 'entry', 'mark', 'peak', 'tier', 'distance', 'verified', 'params'):
+                array = getattr(self, name)
+                array[row] = array[last]
+            self.symbols[row] = moved
+            self.index[moved] = row
+        self.symbols.pop()
+        self.mark[last] = np.nan
+
+    def get(self, pair:str) -> dict | None:
+        row = self.index.get(pair)
+        if row is None:
+            return None
+        return {
+            'side': 'long' if self.side[row] > 0 else 'short',
+            'size': float(self.size[row]),
+            'entry_price': float(self.entry[row]),
+            'mark_price': float(self.mark[row]),
+            'highest_profit': float(self.peak[row]),
+            'tier': int(self.tier[row]),
+        }
+
+    def evaluate(self, pairs:list[str] | None = None) -> Evaluation:
+        # 更新最高盈虧、檔位與距邊界距離並回傳觸發平倉的原因；尚無標記價格或未經確認的還原倉位不評估
+        if pairs is None:
+            rows = np.arange(len(self.symbols))
+        else:
+            rows = np.fromiter((self.index[pair] for pair in pairs if pair in self.index), dtype=np.intp)
+        rows = rows[np.isfinite(self.mark[rows]) & self.verified[rows] & (self.side[rows] != 0)]
+
+        params = self.params[rows]
+        entry = self.entry[rows]
+        profit = self.side[rows] * (self.mark[rows] - entry) / entry * 100
+
+        previous_tier = self.tier[rows].copy()
+        peak = np.maximum(self.peak[rows], profit)
+        thresholds = params[:, LOW_ENABLE:SECOND_ENABLE + 1]
+        tier = (peak[:, None] >= thresholds).sum(axis=1).astype(np.int8) - 1
+
+        stop_loss = -params[:, STOP_LOSS]
+        level = np.select(
+            [tier == 0, tier == 1, tier == 2],
+            [params[:, LOW_STOP], peak * (1 - params[:, TRAIL_STOP]), peak * (1 - params[:, HIGHER_STOP])],
+            stop_loss,
+        )
+
+        reason = np.full(len(rows), NO_EXIT, dtype=np.int8)
+        reason[profit <= stop_loss] = EXIT_REASONS.index('stop_loss')
+        trailing = (tier >= 0) & (profit <= level)
+        reason[trailing] = tier[trailing] + 1
+
+        next_threshold = np.take_along_axis(
+            np.concatenate([thresholds, np.full((len(rows), 1), np.inf)], axis=1),
+            (tier + 1)[:, None].astype(np.intp), axis=1,
+        )[:, 0]
+        self.distance[rows] = np.minimum(profit - level, next_threshold - profit)
+        self.peak[rows] = peak
+        self.tier[rows] = tier
+
+        return Evaluation([self.symbols[row] for row in rows], profit, peak, tier, previous_tier, level, reason)
+
+    def near_boundary(self, pct:float) -> list[str]:
+        # 盈虧距平倉價或下一檔門檻在 pct 個百分點內的倉位
+        n = len(self.symbols)
+        return [self.symbols[row] for row in np.flatnonzero(self.distance[:n] <= pct)]
+
+    def to_state(self) -> dict:
+        return {
+            pair: {
+                'side': 'long' if self.side[row] > 0 else 'short',
+                'entry_price': float(self.entry[row]),
+                'highest_profit': float(self.peak[row]),
+                'tier': int(self.tier[row]),
+            }
+            for pair, row in self.index.items()
+        }
+
+    def restore(self, state:dict):
+        # 還原的倉位在下一次收到實際倉位資料前不會被評估
+        for pair, item in state.items():
+            row = self.index.get(pair)
+            if row is None:
+                row = self._insert(pair)
+            self.side[row] = SIDES[item['side']]
+            self.entry[row] = float(item['entry_price'])
+            self.peak[row] = float(item['highest_profit'])
+            self.tier[row] = int(item['tier'])
+            self.verified[row] = False
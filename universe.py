@@ -0,0 +1,144 @@
+import math
+
+import numpy as np
+
+# 評分權重：成交額、振幅越高越好，買賣價差越大越差
+# range 為振幅項：有提供 volatility（_process_pair 的 ATR 比率與平均振幅）時使用它，否則以 24h 高低價差粗略代替
+DEFAULT_WEIGHTS = {'volume': 1.0, 'range': 1.0, 'spread': 0.5}
+
+def ticker_arrays(tickers:dict[str, dict], symbols:list[str]) -> dict[str, np.ndarray]:
+    # 將 fetch_tickers 的結果轉為欄位陣列，缺值以 NaN 表示
+    def column(field:str) -> np.ndarray:
+        return np.fromiter(
+            (float(tickers[s].get(field) or 'nan') for s in symbols),
+            dtype=np.float64, count=len(symbols),
+        )
+    return {field: column(field) for field in ('bid', 'ask', 'last', 'high', 'low', 'quoteVolume')}
+
+def percentile_rank(values:np.ndarray) -> np.ndarray:
+    # 0（最小）到 1（最大）的名次比例
+    if len(values) <= 1:
+        return np.ones_like(values)
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[np.argsort(values, kind='stable')] = np.arange(len(values))
+    return ranks / (len(values) - 1)
+
+def volatility_measure(atr_ratio:float, average_amplitude:float) -> float:
+    # 與 target_prices 相同的掛單距離基準（未乘 value_multiplier），單位為 %
+    return (average_amplitude + atr_ratio) / 2
+
+def kline_volatility(klines:np.ndarray, atr_period:int = 60, amplitude_period:int = 60) -> np.ndarray:
+    # klines 為 (交易對數, 根數, OHLCV) 的陣列，每個交易對取最後 atr_period + 1 根計算 ATR 比率、最後 amplitude_period 根計算平均振幅，
+    # 與 IndicatorEngine 在同一段K線上的數值相同；回傳各交易對的 volatility_measure
+    high, low, close = klines[:, :, 2], klines[:, :, 3], klines[:, :, 4]
+    prev_close = close[:, -atr_period - 1:-1]
+    recent_high, recent_low = high[:, -atr_period:], low[:, -atr_period:]
+    tr = np.fmax(recent_high - recent_low, np.fmax(np.abs(recent_high - prev_close), np.abs(recent_low - prev_close)))
+    atr_ratio = tr.mean(axis=1) / close[:, -1] * 100
+    amplitude = (high[:, -amplitude_period:] - low[:, -amplitude_period:]) / close[:, -amplitude_period:] * 100
+    return volatility_measure(atr_ratio, amplitude.mean(axis=1))
+
+def score_universe(arrays:dict[str, np.ndarray], weights:dict[str, float] | None = None, min_quote_volume:float = 0.0, max_spread_bps:float = math.inf, volatility:np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    # 回傳 (分數, 是否符合門檻)，一次計算整個市場
+    # volatility 為各交易對的 volatility_measure（NaN 視為不符合門檻）；未提供時以 24h 高低價差相對現價的百分比粗略代替，
+    # 後者是整段 24h 的區間，與每根 1m K線的平均振幅量綱不同
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    bid, ask, last = arrays['bid'], arrays['ask'], arrays['last']
+    mid = (bid + ask) / 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread_bps = (ask - bid) / mid * 10_000
+        range_pct = (arrays['high'] - arrays['low']) / last * 100 if volatility is None else volatility
+        log_volume = np.log1p(arrays['quoteVolume'])
+
+    eligible = (
+        np.isfinite(spread_bps) & np.isfinite(range_pct) & np.isfinite(log_volume)
+        & (bid > 0) & (ask >= bid)
+        & (arrays['quoteVolume'] >= min_quote_volume)
+        & (spread_bps <= max_spread_bps)
+    )
+
+    scores = np.full(len(bid), -np.inf)
+    if eligible.any():
+        scores[eligible] = (
+            weights['volume'] * percentile_rank(log_volume[eligible])
+            + weights['range'] * percentile_rank(range_pct[eligible])
+            - weights['spread'] * percentile_rank(spread_bps[eligible])
+        )
+    return scores, eligible
+
+class UniverseScanner:
+    # 依全市場 USDT 永續合約的即時行情挑選交易對
+    # 兩階段：shortlist 先以成交額與價差初篩出 shortlist_size 個，呼叫端再抓取K線以 kline_volatility 計算實際的 ATR 比率與平均振幅供 update 排名
+    # 遲滯：名次進入前 size 名才加入，已選入的交易對直到名次掉出 exit_rank 或不再符合門檻才移除
+    def __init__(self, size:int, exit_rank:int | None = None, min_quote_volume:float = 0.0, max_spread_bps:float = math.inf, weights:dict[str, float] | None = None, exclude=(), settle:str = 'USDT', shortlist_size:int | None = None):
+        self.size = int(size)
+        self.exit_rank = int(exit_rank) if exit_rank is not None else self.size * 2
+        self.shortlist_size = int(shortlist_size) if shortlist_size is not None else self.exit_rank
+        self.min_quote_volume = float(min_quote_volume)
+        self.max_spread_bps = float(max_spread_bps)
+        self.weights = weights
+        self.exclude = set(exclude)
+        self.settle = settle
+        self.active: list[str] = []
+
+    @classmethod
+    def from_config(cls, universe:dict) -> 'UniverseScanner':
+        return cls(
+            size=int(universe.get("size", 10)),
+            exit_rank=universe.get("exit_rank"),
+            min_quote_volume=float(universe.get("min_quote_volume", 0)),
+            max_spread_bps=float(universe.get("max_spread_bps", math.inf)),
+            weights=universe.get("weights"),
+            exclude=universe.get("exclude", []),
+            shortlist_size=universe.get("shortlist_size"),
+        )
+
+    def candidates(self, tickers:dict[str, dict], markets:dict[str, dict]) -> list[str]:
+        return [
+            symbol for symbol in tickers
+            if symbol in markets and symbol not in self.exclude
+            and markets[symbol].get('swap') and markets[symbol].get('linear')
+            and markets[symbol].get('settle') == self.settle and markets[symbol].get('active', True)
+        ]
+
+    def rank(self, tickers:dict[str, dict], markets:dict[str, dict], volatility:dict[str, float] | None = None) -> list[str]:
+        # 符合門檻的交易對，依分數由高到低排序；提供 volatility 時只排名其中的交易對
+        symbols = self.candidates(tickers, markets)
+        if volatility is not None:
+            symbols = [symbol for symbol in symbols if symbol in volatility]
+        if not symbols:
+            return []
+        measure = None if volatility is None else np.fromiter((volatility[s] for s in symbols), dtype=np.float64, count=len(symbols))
+        scores, eligible = score_universe(ticker_arrays(tickers, symbols), self.weights, self.min_quote_volume, self.max_spread_bps, measure)
+        order = np.argsort(-scores, kind='stable')[:int(eligible.sum())]
+        return [symbols[i] for i in order]
+
+    def shortlist(self, tickers:dict[str, dict], markets:dict[str, dict]) -> list[str]:
+        # 只以成交額與價差初篩（不需要K線）；目前已選入的交易對一併列入，才能判斷是否該移除
+        weights = {**DEFAULT_WEIGHTS, **(self.weights or {}), 'range': 0.0}
+        symbols = self.candidates(tickers, markets)
+        if not symbols:
+            return []
+        scores, eligible = score_universe(ticker_arrays(tickers, symbols), weights, self.min_quote_volume, self.max_spread_bps)
+        order = np.argsort(-scores, kind='stable')[:min(int(eligible.sum()), self.shortlist_size)]
+        ranked = [symbols[i] for i in order]
+        return ranked + [symbol for symbol in self.active if symbol not in ranked and symbol in tickers]
+
+    def update(self, tickers:dict[str, dict], markets:dict[str, dict], volatility:dict[str, float] | None = None) -> tuple[list[str], list[str]]:
+        # 回傳 (新加入, 被移除) 的交易對；volatility 為 shortlist 中各交易對的 volatility_measure
+        # 仍在行情中、但 volatility 缺少（K線抓取失敗）的已選入交易對保留到下次掃描，不因暫時性錯誤撤單移除
+        ranking = {symbol: i for i, symbol in enumerate(self.rank(tickers, markets, volatility))}
+        unmeasured = set() if volatility is None else {symbol for symbol in self.active if symbol in tickers and symbol not in volatility}
+        kept = [symbol for symbol in self.active if ranking.get(symbol, math.inf) < self.exit_rank or symbol in unmeasured]
+        removed = [symbol for symbol in self.active if symbol not in kept]
+
+        added = []
+        for symbol, rank in ranking.items():
+            if len(kept) + len(added) >= self.size or rank >= self.size:
+                break
+            if symbol not in kept:
+                added.append(symbol)
+
+        self.active = kept + added
+        return added, removed
@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import json
+
+from aiohttp import web, WSMsgType
+
+# 本地 WebSocket 替身伺服器：依時間間隔重播 BybitStream(record_path=...) 錄下的推播
+# 用法：python ws_replay_server.py recorded.jsonl --port 8765
+# 並在 trailing_config.json 設定
+#   "stream_public_url": "ws://127.0.0.1:8765/v5/public/linear"
+#   "stream_private_url": "ws://127.0.0.1:8765/v5/private"
+
+def load_recording(path:str) -> list[dict]:
+    with open(path, 'r', encoding='utf-8') as F:
+        return [json.loads(line) for line in F if line.strip()]
+
+def ack(request:dict) -> dict:
+    op = request.get('op')
+    if op == 'ping':
+        return {'op': 'pong', 'success': True, 'ret_msg': 'pong'}
+    return {'op': op, 'success': True, 'ret_msg': '', 'req_id': request.get('req_id', '')}
+
+def make_handler(channel:str, recording:list[dict], speed:float):
+    async def handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async def replay():
+            messages = [r for r in recording if r['channel'] == channel]
+            previous = messages[0]['ts'] if messages else 0
+            for record in messages:
+                await asyncio.sleep(max(record['ts'] - previous, 0) / speed)
+                previous = record['ts']
+                if ws.closed:
+                    return
+                if record['message'].get('op'):
+                    continue    # 錄製時收到的 auth/subscribe 回覆由 ack() 即時產生
+                await ws.send_json(record['message'])
+
+        replay_task = None
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+            await ws.send_json(ack(json.loads(msg.data)))
+            if replay_task is None:
+                replay_task = asyncio.create_task(replay())
+
+        if replay_task is not None:
+            replay_task.cancel()
+        return ws
+
+    return handler
+
+def create_app(recording:list[dict], speed:float = 1.0) -> web.Application:
+    app = web.Application()
+    app.router.add_get('/v5/public/linear', make_handler('public', recording, speed))
+    app.router.add_get('/v5/private', make_handler('private', recording, speed))
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bybit WebSocket 重播伺服器')
+    parser.add_argument('recording')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--speed', type=float, default=1.0, help='重播速度倍率')
+    args = parser.parse_args()
+
+    web.run_app(create_app(load_recording(args.recording), args.speed), host=args.host, port=args.port)